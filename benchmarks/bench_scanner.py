@@ -0,0 +1,164 @@
+"""Benchmark del camino de parseo del escáner.
+
+Pasa salidas de ``arp-scan --plain`` e ``ip neigh`` de distintos tamaños por
+``Scanner._scan_arp_scan``, ``Scanner._scan_ip_neigh`` y
+``Scanner._normalize_vendor`` (sin lanzar procesos: ``run`` se sustituye por
+la salida grabada) y muestra el rendimiento y las asignaciones de memoria.
+
+Uso::
+
+    python benchmarks/bench_scanner.py
+    python benchmarks/bench_scanner.py --sizes 10,1000 --repeat 20
+    python benchmarks/bench_scanner.py --save-fixtures benchmarks/fixtures
+    python benchmarks/bench_scanner.py --fixtures benchmarks/fixtures
+
+Con ``--fixtures`` se usan ficheros ``arp-scan-<N>.txt`` / ``ip-neigh-<N>.txt``
+de ese directorio (por ejemplo capturas reales) en lugar de generarlos.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raspsentinel import scanner as scanner_mod  # noqa: E402
+from raspsentinel.scanner import Scanner, parse_arp_scan_line  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+VENDORS = ("Raspberry Pi Trading Ltd", "Apple, Inc.", "Espressif Inc.", "TP-LINK TECHNOLOGIES CO.,LTD.", "(Unknown)")
+NEIGH_STATES = ("REACHABLE", "STALE", "DELAY")
+
+
+def _hosts(count: int, seed: int = 1) -> List[Tuple[str, str]]:
+    rnd = random.Random(seed + count)
+    hosts = []
+    for i in range(count):
+        ip = f"10.{(i >> 16) & 0xFF}.{(i >> 8) & 0xFF}.{i & 0xFF or 1}"
+        mac = ":".join(f"{rnd.randrange(256):02x}" for _ in range(6))
+        hosts.append((ip, mac))
+    return hosts
+
+
+def make_arp_scan(count: int) -> str:
+    rnd = random.Random(count)
+    return "".join(f"{ip}\t{mac}\t{rnd.choice(VENDORS)}\n" for ip, mac in _hosts(count))
+
+
+def make_ip_neigh(count: int, iface: str = "eth0") -> str:
+    rnd = random.Random(count)
+    lines = [f"{ip} dev {iface} lladdr {mac} {rnd.choice(NEIGH_STATES)}\n" for ip, mac in _hosts(count)]
+    # entradas sin dirección, como las que aparecen en una tabla real
+    lines += [f"10.255.0.{i} dev {iface} FAILED\n" for i in range(1, max(2, count // 20))]
+    return "".join(lines)
+
+
+def load_fixtures(directory: str | None, sizes: List[int]) -> Dict[Tuple[str, int], str]:
+    fixtures = {}
+    for size in sizes:
+        for kind, make in (("arp-scan", make_arp_scan), ("ip-neigh", make_ip_neigh)):
+            path = os.path.join(directory, f"{kind}-{size}.txt") if directory else None
+            if path and os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as fh:
+                    fixtures[(kind, size)] = fh.read()
+            else:
+                fixtures[(kind, size)] = make(size)
+    return fixtures
+
+
+def save_fixtures(directory: str, fixtures: Dict[Tuple[str, int], str]):
+    os.makedirs(directory, exist_ok=True)
+    for (kind, size), text in fixtures.items():
+        with open(os.path.join(directory, f"{kind}-{size}.txt"), "w", encoding="utf-8") as fh:
+            fh.write(text)
+
+
+def _timed(fn: Callable[[], int], repeat: int) -> Tuple[float, int]:
+    """Mejor tiempo de ``repeat`` ejecuciones y número de elementos procesados."""
+    best = float("inf")
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, items
+
+
+def _allocations(fn: Callable[[], int]) -> Tuple[int, int]:
+    """Pico de memoria (bytes) y bloques que siguen vivos tras una ejecución (cachés)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return peak, blocks
+
+
+def cases(fixtures: Dict[Tuple[str, int], str], size: int) -> List[Tuple[str, Callable[[], int]]]:
+    scanner = Scanner("eth0", backend="auto")
+    arp_out = fixtures[("arp-scan", size)]
+    neigh_out = fixtures[("ip-neigh", size)]
+    macs = [parsed[1] for parsed in map(parse_arp_scan_line, arp_out.splitlines()) if parsed]
+
+    def scan_arp_scan() -> int:
+        scanner_mod.run = lambda cmd, timeout=15: arp_out
+        return len(scanner._scan_arp_scan())
+
+    def scan_ip_neigh() -> int:
+        scanner_mod.run = lambda cmd, timeout=15: neigh_out
+        return len(scanner._scan_ip_neigh())
+
+    def normalize_vendor() -> int:
+        for mac in macs:
+            Scanner._normalize_vendor(mac, None)
+        return len(macs)
+
+    return [
+        ("_scan_arp_scan", scan_arp_scan),
+        ("_scan_ip_neigh", scan_ip_neigh),
+        ("_normalize_vendor", normalize_vendor),
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="hosts por fixture, separados por comas")
+    ap.add_argument("--repeat", type=int, default=5, help="ejecuciones por caso (se toma la mejor)")
+    ap.add_argument("--fixtures", help="directorio con salidas grabadas")
+    ap.add_argument("--save-fixtures", metavar="DIR", help="guarda las salidas generadas y termina")
+    args = ap.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    fixtures = load_fixtures(args.fixtures, sizes)
+    if args.save_fixtures:
+        save_fixtures(args.save_fixtures, fixtures)
+        print(f"Fixtures guardadas en {args.save_fixtures}")
+        return
+
+    original_run = scanner_mod.run
+    header = f"{'caso':<20}{'hosts':>8}{'ms':>10}{'hosts/s':>12}{'pico KiB':>10}{'retenidos':>10}"
+    print(header)
+    print("-" * len(header))
+    try:
+        for size in sizes:
+            for name, fn in cases(fixtures, size):
+                fn()  # calentamiento (carga de tablas de fabricantes, cachés)
+                elapsed, items = _timed(fn, args.repeat)
+                peak, blocks = _allocations(fn)
+                rate = items / elapsed if elapsed else float("inf")
+                print(f"{name:<20}{items:>8}{elapsed * 1000:>10.2f}{rate:>12.0f}{peak / 1024:>10.1f}{blocks:>10}")
+    finally:
+        scanner_mod.run = original_run
+
+
+if __name__ == "__main__":
+    main()
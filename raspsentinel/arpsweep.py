@@ -0,0 +1,136 @@
+"""Barrido ARP en proceso mediante un socket ``AF_PACKET`` (Linux, CAP_NET_RAW).
+
+Envía las peticiones ARP de toda la subred en lotes y recoge las respuestas
+en un único bucle con fecha límite, sin lanzar procesos externos.
+"""
+from __future__ import annotations
+
+import fcntl
+import ipaddress
+import select
+import socket
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ETH_P_ARP = 0x0806
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891B
+SIOCGIFHWADDR = 0x8927
+
+BROADCAST = b"\xff" * 6
+ARP_HEADER = struct.Struct("!HHBBH6s4s6s4s")
+ETH_HEADER = struct.Struct("!6s6sH")
+MAX_HOSTS = 4096
+BATCH = 64
+
+
+@dataclass
+class InterfaceInfo:
+    name: str
+    mac: bytes
+    ip: str
+    network: ipaddress.IPv4Network
+
+
+def _ioctl(sock: socket.socket, request: int, iface: str) -> bytes:
+    return fcntl.ioctl(sock.fileno(), request, struct.pack("256s", iface.encode()[:15]))
+
+
+def interface_info(iface: str) -> InterfaceInfo:
+    """MAC, IPv4 y red de la interfaz vía ioctl."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ip = socket.inet_ntoa(_ioctl(sock, SIOCGIFADDR, iface)[20:24])
+        mask = socket.inet_ntoa(_ioctl(sock, SIOCGIFNETMASK, iface)[20:24])
+        mac = _ioctl(sock, SIOCGIFHWADDR, iface)[18:24]
+    network = ipaddress.IPv4Network(f"{ip}/{mask}", strict=False)
+    return InterfaceInfo(name=iface, mac=mac, ip=ip, network=network)
+
+
+def format_mac(raw: bytes) -> str:
+    return ":".join(f"{b:02X}" for b in raw)
+
+
+def parse_mac(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(":", "").replace("-", ""))
+
+
+def build_request(src_mac: bytes, src_ip: str, target_ip: str, dst_mac: bytes = BROADCAST) -> bytes:
+    """Trama Ethernet con una petición ARP (who-has ``target_ip``)."""
+    eth = ETH_HEADER.pack(dst_mac, src_mac, ETH_P_ARP)
+    arp = ARP_HEADER.pack(
+        1, 0x0800, 6, 4, 1,
+        src_mac, socket.inet_aton(src_ip),
+        b"\x00" * 6, socket.inet_aton(target_ip),
+    )
+    return eth + arp
+
+
+def parse_reply(frame: bytes, own_ip: bytes) -> Optional[Tuple[str, str]]:
+    """Devuelve ``(ip, mac)`` si la trama es una respuesta ARP dirigida a nosotros."""
+    if len(frame) < ETH_HEADER.size + ARP_HEADER.size:
+        return None
+    if frame[12:14] != b"\x08\x06":
+        return None
+    _, _, _, _, op, sha, spa, _, tpa = ARP_HEADER.unpack_from(frame, ETH_HEADER.size)
+    if op != 2 or tpa != own_ip:
+        return None
+    return socket.inet_ntoa(spa), format_mac(sha)
+
+
+def sweep(
+    iface: str,
+    timeout: float = 1.0,
+    targets: Optional[Iterable[Tuple[str, Optional[str]]]] = None,
+) -> List[Dict[str, str]]:
+    """Barre la subred de ``iface`` (o solo ``targets``) y devuelve ``[{ip, mac}]``.
+
+    ``targets`` es una lista de ``(ip, mac)``; si se conoce la MAC la petición
+    se envía en unicast. La espera termina ``timeout`` segundos después del
+    último envío.
+    """
+    info = interface_info(iface)
+    if targets is None:
+        if info.network.num_addresses > MAX_HOSTS + 2:
+            raise ValueError(f"Subred {info.network} demasiado grande para el barrido ARP")
+        plan = [(str(host), None) for host in info.network.hosts() if str(host) != info.ip]
+    else:
+        plan = [(ip, mac) for ip, mac in targets if ip and ip != info.ip]
+    own_ip = socket.inet_aton(info.ip)
+    found: Dict[str, str] = {}
+
+    with socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP)) as sock:
+        sock.bind((iface, ETH_P_ARP))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.setblocking(False)
+
+        def drain(wait: float):
+            ready, _, _ = select.select([sock], [], [], wait)
+            while ready:
+                try:
+                    frame = sock.recv(128)
+                except BlockingIOError:
+                    return
+                reply = parse_reply(frame, own_ip)
+                if reply:
+                    found.setdefault(reply[1], reply[0])
+
+        for start in range(0, len(plan), BATCH):
+            for ip, mac in plan[start : start + BATCH]:
+                dst = parse_mac(mac) if mac else BROADCAST
+                try:
+                    sock.send(build_request(info.mac, info.ip, ip, dst))
+                except BlockingIOError:
+                    drain(0.01)
+                    sock.send(build_request(info.mac, info.ip, ip, dst))
+            drain(0)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            drain(remaining)
+
+    return [{"ip": ip, "mac": mac} for mac, ip in found.items()]
@@ -0,0 +1,85 @@
+"""Clasificación de MAC administradas localmente (aleatorias).
+
+Los móviles y portátiles modernos usan direcciones privadas con el bit
+"localmente administrada" (0x02 del primer octeto) activo. Esas MAC nunca
+coinciden con un OUI y cambian por red o cada cierto tiempo, así que no se
+buscan en la tabla de fabricantes y se marcan con ``randomized``.
+
+Opcionalmente se agrupan por huella DHCP (hostname + lista de parámetros
+pedidos, opción 55): una MAC aleatoria nueva con la misma huella que un
+dispositivo ya conocido se anota con ``alias_of``.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+CLASSIFY_FIELDS = ("randomized", "fingerprint", "alias_of")
+
+
+def is_randomized(mac: str) -> bool:
+    """``True`` si la MAC es unicast y administrada localmente."""
+    try:
+        first = int(mac[:2], 16)
+    except ValueError:
+        return False
+    return first & 0x03 == 0x02
+
+
+def dhcp_fingerprint(dev: Dict[str, Any]) -> Optional[str]:
+    """Huella estable de un cliente DHCP, o ``None`` sin lista de parámetros."""
+    params = dev.get("dhcp_params")
+    if not params:
+        return None
+    hostname = (dev.get("hostname") or "").strip().lower()
+    key = f"{hostname}|{','.join(str(p) for p in params)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def classify(dev: Dict[str, Any], fingerprints: Optional["FingerprintIndex"] = None) -> Dict[str, Any]:
+    """Marca ``randomized`` y, con ``fingerprints``, ``fingerprint`` y ``alias_of``."""
+    if not is_randomized(dev["mac"]):
+        return dev
+    dev["randomized"] = True
+    if fingerprints is not None:
+        fp = dhcp_fingerprint(dev)
+        if fp:
+            dev["fingerprint"] = fp
+            alias = fingerprints.link(dev["mac"], fp)
+            if alias:
+                dev["alias_of"] = alias
+    return dev
+
+
+class FingerprintIndex:
+    """Huella DHCP -> primera MAC en la que se vio."""
+
+    def __init__(self):
+        self._macs: Dict[str, str] = {}
+        self._seen: Dict[str, str] = {}
+
+    def load(self, devices: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Carga las huellas guardadas en el store (``recent_devices``)."""
+        for mac, dev in devices:
+            fp = dev.get("fingerprint")
+            if fp:
+                self._macs.setdefault(fp, dev.get("alias_of") or mac)
+                self._seen[mac] = fp
+
+    def known(self, mac: str, fp: str) -> bool:
+        """``True`` si ``mac`` ya estaba asociada a ``fp``."""
+        return self._seen.get(mac) == fp
+
+    def link(self, mac: str, fp: str) -> Optional[str]:
+        """Asocia ``mac`` a ``fp`` y devuelve la MAC previa con esa huella, si otra."""
+        self._seen[mac] = fp
+        first = self._macs.setdefault(fp, mac)
+        return first if first != mac else None
+
+    def forget(self, macs: Iterable[str]):
+        """Olvida MAC purgadas del store."""
+        gone = {mac.upper() for mac in macs}
+        for mac in gone:
+            self._seen.pop(mac, None)
+        for fp in [fp for fp, mac in self._macs.items() if mac in gone]:
+            del self._macs[fp]
@@ -4,19 +4,28 @@ import json
 import os
 import subprocess
 import sys
-from typing import Any, Callable, List, Optional
+from typing import Any, List, Optional
 
 import typer
 import yaml
 
-from .store import Store
+from .control import ControlError, apply_op, daemon_running, send_command
+from .ouidb import compile_db
+from .presence import PresenceLog
+from .retention import RetentionPolicy, select_expired
+from .store import SNAPSHOT_FILES, STATUSES, Store, convert_snapshot, open_store
+from .vendors import VENDOR_DB_NAME, download_registries, registry_sources
 
 app = typer.Typer(add_completion=False, help="Herramientas para instalar y operar Raspsentinel.")
 config_app = typer.Typer(add_completion=False, help="Operaciones sobre la configuración.")
 devices_app = typer.Typer(add_completion=False, help="Consulta y gestión de dispositivos.")
+store_app = typer.Typer(add_completion=False, help="Mantenimiento del almacenamiento de dispositivos.")
+vendors_app = typer.Typer(add_completion=False, help="Base de datos de fabricantes (OUI).")
 
 app.add_typer(config_app, name="config")
 app.add_typer(devices_app, name="devices")
+app.add_typer(store_app, name="store")
+app.add_typer(vendors_app, name="vendors")
 
 CONF_PATH = "/etc/raspsentinel/config.yaml"
 SERVICE_NAME = "raspsentinel.service"
@@ -32,11 +41,15 @@ COMMAND_OVERVIEW = """Comandos principales:
   allowlist [--manage]    Lista dispositivos permitidos y permite editarlos.
   blocklist [--manage]    Lista dispositivos bloqueados y permite editarlos.
   devices list            Lista dispositivos vistos (usar -s para filtrar).
-  devices info MAC        Muestra detalles de un dispositivo.
+  devices info MAC|IP     Muestra detalles de un dispositivo (también por nombre).
   devices allow MAC       Añade un dispositivo a la allowlist.
   devices block MAC       Añade un dispositivo a la blocklist.
   devices unblock MAC     Quita un dispositivo de la blocklist.
   devices name MAC NAME   Asigna un nombre amigable.
+  devices prune           Purga el historial (usar --dry-run para simular).
+  store convert FORMATO   Convierte el snapshot a json|binary.
+  vendors compile         Precompila la tabla de fabricantes (MA-L/MA-M/MA-S).
+  vendors update          Descarga los registros del IEEE y recompila la tabla.
   config show             Muestra la configuración actual.
   config get CLAVE        Obtiene una clave (ej. network.interface).
   config set CLAVE VALOR  Actualiza una clave.
@@ -165,13 +178,13 @@ def allowlist(manage: bool = typer.Option(False, "--manage", "-m", help="Abrir a
     """Muestra la allowlist y opcionalmente permite editarla."""
     cfg = _load_config()
     store = _store_from_config(cfg)
-    allow = _collect_devices(store, lambda d: d.get("allow"))
+    allow = _collect_devices(store, "allow")
     if not allow:
         typer.echo("Allowlist vacía.")
         return
     _print_table(allow, title="Allowlist actual")
     if manage:
-        _interactive_toggle(store, allow, action="unallow")
+        _interactive_toggle(cfg, allow, action="unallow")
 
 
 @app.command()
@@ -179,13 +192,13 @@ def blocklist(manage: bool = typer.Option(False, "--manage", "-m", help="Abrir a
     """Muestra la blocklist y permite desbloquear dispositivos."""
     cfg = _load_config()
     store = _store_from_config(cfg)
-    blocked = _collect_devices(store, lambda d: d.get("block"))
+    blocked = _collect_devices(store, "block")
     if not blocked:
         typer.echo("Blocklist vacía.")
         return
     _print_table(blocked, title="Blocklist actual")
     if manage:
-        _interactive_toggle(store, blocked, action="unblock")
+        _interactive_toggle(cfg, blocked, action="unblock")
 
 
 @devices_app.command("list")
@@ -195,13 +208,16 @@ def devices_list(
     """Lista los dispositivos vistos con filtros sencillos."""
     cfg = _load_config()
     store = _store_from_config(cfg)
-    devices = store.list_devices()
-    rows = []
     status = status.lower()
+    if status == "all":
+        devices = store.list_devices()
+    elif status in STATUSES:
+        devices = store.devices_with_status(status)
+    else:
+        raise typer.BadParameter(f"Filtro desconocido: {status}")
+    rows = []
     for mac, info in devices.items():
         status_flag = _device_status(info)
-        if status != "all" and status_flag.lower() != status:
-            continue
         rows.append(
             {
                 "mac": mac,
@@ -218,14 +234,14 @@ def devices_list(
 
 
 @devices_app.command("info")
-def devices_info(mac: str) -> None:
+def devices_info(term: str = typer.Argument(..., metavar="MAC|IP|NOMBRE")) -> None:
     """Muestra la ficha completa de un dispositivo."""
     cfg = _load_config()
     store = _store_from_config(cfg)
-    mac = mac.upper()
-    device = store.list_devices().get(mac)
+    mac = store.resolve(term)
+    device = store.get_device(mac) if mac else None
     if not device:
-        typer.echo(f"No se encontraron datos para {mac}")
+        typer.echo(f"No se encontraron datos para {term}")
         raise typer.Exit(code=1)
     typer.echo(f"MAC:    {mac}")
     typer.echo(f"Nombre: {device.get('name') or '—'}")
@@ -236,14 +252,18 @@ def devices_info(mac: str) -> None:
     typer.echo(f"Último visto: {device.get('last_seen')}")
     if notes := device.get("notes"):
         typer.echo(f"Notas:  {notes}")
+    history = PresenceLog(cfg.get("app", {}).get("data_dir", "/var/lib/raspsentinel")).summary(mac)
+    if history:
+        typer.echo("Presencia:")
+        for line in history:
+            typer.echo(f"  {line}")
 
 
 @devices_app.command("allow")
 def devices_allow(mac: str, name: Optional[str] = typer.Option(None, "--name", "-n", help="Nombre opcional.")) -> None:
     """Añade un dispositivo a la allowlist."""
     cfg = _load_config()
-    store = _store_from_config(cfg)
-    store.mark_allow(mac, name)
+    _store_command(cfg, "allow", mac, name)
     typer.echo(f"{mac.upper()} añadido a allowlist.")
 
 
@@ -251,8 +271,7 @@ def devices_allow(mac: str, name: Optional[str] = typer.Option(None, "--name", "
 def devices_block(mac: str, notes: Optional[str] = typer.Option(None, "--notes", "-n", help="Motivo/nota opcional.")) -> None:
     """Añade un dispositivo a la blocklist."""
     cfg = _load_config()
-    store = _store_from_config(cfg)
-    store.mark_block(mac, notes)
+    _store_command(cfg, "block", mac, notes)
     typer.echo(f"{mac.upper()} añadido a blocklist.")
 
 
@@ -260,8 +279,7 @@ def devices_block(mac: str, notes: Optional[str] = typer.Option(None, "--notes",
 def devices_unblock(mac: str) -> None:
     """Quita un dispositivo de la blocklist."""
     cfg = _load_config()
-    store = _store_from_config(cfg)
-    store.unblock(mac)
+    _store_command(cfg, "unblock", mac)
     typer.echo(f"{mac.upper()} desbloqueado.")
 
 
@@ -269,10 +287,102 @@ def devices_unblock(mac: str) -> None:
 def devices_name(mac: str, name: str) -> None:
     """Asignar o actualizar el nombre amigable."""
     cfg = _load_config()
-    store = _store_from_config(cfg)
-    store.set_name(mac, name)
+    _store_command(cfg, "name", mac, name)
     typer.echo(f"{mac.upper()} ahora se llama '{name}'.")
 
+
+@devices_app.command("prune")
+def devices_prune(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Mostrar qué se purgaría sin borrar nada."),
+) -> None:
+    """Purga dispositivos antiguos según la sección retention de la configuración."""
+    cfg = _load_config()
+    store = _store_from_config(cfg)
+    policy = RetentionPolicy.from_config(cfg.get("retention", {}))
+    expired = select_expired(store.recent_devices(), policy)
+    if not expired:
+        typer.echo("Nada que purgar.")
+        return
+    for mac in expired[:50]:
+        device = store.get_device(mac) or {}
+        typer.echo(f"{mac}  {device.get('vendor') or '?'}  visto {device.get('last_seen') or device.get('first_seen')}")
+    if len(expired) > 50:
+        typer.echo(f"... ({len(expired) - 50} más)")
+    if dry_run:
+        typer.echo(f"{len(expired)} dispositivos se purgarían (--dry-run).")
+        return
+    store.close()
+    data_dir = cfg.get("app", {}).get("data_dir", "/var/lib/raspsentinel")
+    try:
+        # con el daemon en marcha la purga la hace él (store en memoria, presencia y escaneo)
+        delegated = send_command(data_dir, "delete", expired, timeout=30.0)
+    except ControlError as exc:
+        typer.echo(f"El servicio no pudo purgar: {exc}")
+        raise typer.Exit(code=1)
+    if not delegated:
+        store = _store_from_config(cfg)
+        store.delete_devices(expired)
+        store.close()
+        presence = PresenceLog(data_dir)
+        presence.forget(expired)
+        presence.save()
+    typer.echo(f"{len(expired)} dispositivos purgados.")
+
+
+@store_app.command("convert")
+def store_convert(fmt: str = typer.Argument(..., metavar="FORMATO", help="json|binary")) -> None:
+    """Convierte el snapshot de dispositivos y actualiza app.store_format."""
+    fmt = fmt.lower()
+    if fmt not in SNAPSHOT_FILES:
+        raise typer.BadParameter(f"Formato desconocido: {fmt}")
+    cfg = _load_config()
+    app_cfg = cfg.setdefault("app", {})
+    if str(app_cfg.get("store_backend", "json")).lower() != "json":
+        typer.echo("La conversión solo aplica al backend json.")
+        raise typer.Exit(code=1)
+    data_dir = app_cfg.get("data_dir", "/var/lib/raspsentinel")
+    if daemon_running(data_dir):
+        # el daemon reescribiría el formato antiguo y el journal quedaría huérfano
+        typer.echo("El servicio está en marcha; detenlo antes de convertir (raspsentinel stop).")
+        raise typer.Exit(code=1)
+    total = convert_snapshot(data_dir, fmt)
+    app_cfg["store_format"] = fmt
+    _save_config(cfg)
+    typer.echo(f"{total} dispositivos guardados en {SNAPSHOT_FILES[fmt]}. Reinicia el servicio para aplicarlo.")
+
+
+@vendors_app.command("compile")
+def vendors_compile(
+    sources: Optional[List[str]] = typer.Option(
+        None,
+        "--source",
+        "-s",
+        help="Fichero del registro IEEE (repetible). Por defecto los de arp-scan, ieee-data y los descargados.",
+    ),
+    output: Optional[str] = typer.Option(None, "--output", "-o", help="Ruta de salida (por defecto en data_dir)."),
+) -> None:
+    """Compila los registros MA-L/MA-M/MA-S a la tabla binaria que usa el servicio."""
+    data_dir = _load_config().get("app", {}).get("data_dir", "/var/lib/raspsentinel")
+    found = [path for path in sources if os.path.exists(path)] if sources else registry_sources(data_dir)
+    if not found:
+        typer.echo("No se encontró ningún fichero del registro IEEE (instala arp-scan o ieee-data, o usa 'vendors update').")
+        raise typer.Exit(code=1)
+    target = output or os.path.join(data_dir, VENDOR_DB_NAME)
+    total = compile_db(found, target)
+    typer.echo(f"{total} prefijos compilados en {target} desde {', '.join(found)}.")
+
+
+@vendors_app.command("update")
+def vendors_update() -> None:
+    """Descarga los registros del IEEE a data_dir y recompila la tabla."""
+    data_dir = _load_config().get("app", {}).get("data_dir", "/var/lib/raspsentinel")
+    updated = download_registries(data_dir)
+    if not updated:
+        typer.echo("No se pudo descargar ningún registro; se recompila con los ficheros locales.")
+    vendors_compile(sources=None, output=None)
+    typer.echo("Reinicia el servicio para usar la tabla nueva.")
+
+
 @config_app.command("show")
 def config_show(
     yaml_output: bool = typer.Option(False, "--yaml", help="Imprimir la configuración en YAML."),
@@ -331,24 +441,36 @@ def _save_config(data: dict[str, Any]) -> None:
 
 
 def _store_from_config(cfg: dict[str, Any]) -> Store:
+    return open_store(cfg.get("app", {}))
+
+
+def _store_command(cfg: dict[str, Any], op: str, mac: str, arg: Optional[str] = None) -> None:
+    """Envía la operación al daemon si está activo; si no, escribe en el store."""
     data_dir = cfg.get("app", {}).get("data_dir", "/var/lib/raspsentinel")
-    return Store(data_dir)
+    try:
+        if send_command(data_dir, op, mac, arg):
+            return
+    except ControlError as exc:
+        typer.echo(f"El servicio no pudo aplicar la operación: {exc}")
+        raise typer.Exit(code=1)
+    store = _store_from_config(cfg)
+    apply_op(store, op, mac, arg)
+    store.close()
 
 
-def _collect_devices(store: Store, predicate: Callable[[dict[str, Any]], bool]) -> List[dict[str, Any]]:
-    devices = store.list_devices()
+def _collect_devices(store: Store, status: str) -> List[dict[str, Any]]:
+    devices = store.devices_with_status(status)
     rows: List[dict[str, Any]] = []
-    for mac, info in sorted(devices.items()):
-        if predicate(info):
-            rows.append(
-                {
-                    "mac": mac,
-                    "ip": info.get("ip") or "?",
-                    "name": info.get("name") or "—",
-                    "vendor": info.get("vendor") or "?",
-                    "status": _device_status(info),
-                }
-            )
+    for mac, info in devices.items():
+        rows.append(
+            {
+                "mac": mac,
+                "ip": info.get("ip") or "?",
+                "name": info.get("name") or "—",
+                "vendor": info.get("vendor") or "?",
+                "status": _device_status(info),
+            }
+        )
     return rows
 
 
@@ -362,13 +484,8 @@ def _print_table(rows: List[dict[str, Any]], title: str) -> None:
         )
 
 
-def _interactive_toggle(store: Store, rows: List[dict[str, Any]], action: str) -> None:
-    actions = {
-        "unblock": store.unblock,
-        "unallow": store.unallow,
-    }
-    action_fn = actions.get(action)
-    if action_fn is None:
+def _interactive_toggle(cfg: dict[str, Any], rows: List[dict[str, Any]], action: str) -> None:
+    if action not in {"unblock", "unallow"}:
         return
     label = "desbloquear" if action == "unblock" else "quitar de allowlist"
     while rows:
@@ -385,7 +502,7 @@ def _interactive_toggle(store: Store, rows: List[dict[str, Any]], action: str) -
             typer.echo("Fuera de rango.")
             continue
         mac = rows.pop(idx - 1)["mac"]
-        action_fn(mac)
+        _store_command(cfg, action, mac)
         typer.echo(f"{mac} actualizado.")
         if rows:
             _print_table(rows, "Estado actualizado")
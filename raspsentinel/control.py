@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SOCKET_NAME = "control.sock"
+
+# operación -> (método del store, admite argumento extra); "delete" recibe una lista de MAC
+STORE_OPS: Dict[str, tuple[str, bool]] = {
+    "allow": ("mark_allow", True),
+    "block": ("mark_block", True),
+    "unallow": ("unallow", False),
+    "unblock": ("unblock", False),
+    "name": ("set_name", True),
+    "delete": ("delete_devices", False),
+}
+
+
+class ControlError(RuntimeError):
+    pass
+
+
+def socket_path(data_dir: str) -> str:
+    return os.path.join(data_dir, SOCKET_NAME)
+
+
+def apply_op(store, op: str, mac: Union[str, List[str]], arg: Optional[str] = None) -> None:
+    """Aplica una operación de administración directamente sobre el store."""
+    try:
+        method, takes_arg = STORE_OPS[op]
+    except KeyError:
+        raise ControlError(f"operación desconocida: {op}") from None
+    fn = getattr(store, method)
+    if takes_arg:
+        fn(mac, arg)
+    else:
+        fn(mac)
+
+
+def daemon_running(data_dir: str) -> bool:
+    """``True`` si hay un daemon aceptando conexiones en el socket de control."""
+    path = socket_path(data_dir)
+    if not os.path.exists(path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1.0)
+            sock.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    except OSError:
+        # socket presente pero sin permiso o colgado: mejor asumir que corre
+        return True
+    return True
+
+
+def send_command(
+    data_dir: str, op: str, mac: Union[str, List[str]], arg: Optional[str] = None, timeout: float = 5.0
+) -> bool:
+    """Envía la operación al daemon en ejecución.
+
+    Devuelve ``False`` si no hay daemon escuchando, para que el llamador
+    escriba directamente en el store.
+    """
+    path = socket_path(data_dir)
+    if not os.path.exists(path):
+        return False
+    request = json.dumps({"op": op, "mac": mac, "arg": arg}).encode() + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(request)
+            with sock.makefile("rb") as fh:
+                line = fh.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    except OSError as exc:
+        raise ControlError(f"sin respuesta del servicio: {exc}") from exc
+    try:
+        reply = json.loads(line)
+    except ValueError as exc:
+        raise ControlError("respuesta inválida del servicio") from exc
+    if not reply.get("ok"):
+        raise ControlError(reply.get("error") or "error desconocido")
+    return True
+
+
+class ControlServer:
+    """Socket Unix por el que la CLI delega las escrituras en el daemon.
+
+    Así el daemon es el único escritor del store mientras está en marcha y
+    las operaciones de la CLI no compiten con el ciclo de escaneo.
+    """
+
+    def __init__(self, data_dir: str, handler: Callable[[str, Any, Optional[str]], Awaitable[None]]):
+        self.path = socket_path(data_dir)
+        self.handler = handler
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.info("Socket de control en %s", self.path)
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        reply: Dict[str, Any]
+        line = await reader.readline()
+        if not line:
+            # sondeo de daemon_running: conecta y cierra sin pedir nada
+            writer.close()
+            return
+        try:
+            req = json.loads(line)
+            await self.handler(req["op"], req["mac"], req.get("arg"))
+            reply = {"ok": True}
+        except Exception as exc:
+            logger.error("Operación de control fallida: %s", exc)
+            reply = {"ok": False, "error": str(exc)}
+        try:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
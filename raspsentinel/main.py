@@ -3,18 +3,37 @@ from __future__ import annotations
 import argparse
 import asyncio
 import logging
-from typing import Optional
+import os
+import signal
+import time
+from typing import Any, Dict, List, Optional, Set
 
 import yaml
 
 from .blocker import ArpSpoofBlocker
-from .scanner import Scanner
-from .store import Store
+from .classify import FingerprintIndex, classify, dhcp_fingerprint, is_randomized
+from .control import ControlServer, apply_op
+from .presence import PresenceLog
+from .retention import RetentionPolicy, retention_loop
+from .scanner import ScanDiff, Scanner, ScannerGroup
+from .schedule import AdaptiveScheduler
+from .sniffer import PassiveSniffer
+from .store import open_store
 from .telegram_bot import TelegramBot
+from .vendors import VENDOR_LOOKUP, refresh_database
 
 logger = logging.getLogger(__name__)
 
 
+def _interfaces(net_cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Normaliza ``network.interfaces`` (nombres o ``{name, gateway_ip}``).
+
+    Sin esa lista se usa ``network.interface`` como única interfaz.
+    """
+    entries = net_cfg.get("interfaces") or [net_cfg["interface"]]
+    return [{"name": entry} if isinstance(entry, str) else dict(entry) for entry in entries]
+
+
 async def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", default="/etc/raspsentinel/config.yaml")
@@ -23,31 +42,59 @@ async def main():
     with open(args.config, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
-    data_dir = cfg.get("app", {}).get("data_dir", "/var/lib/raspsentinel")
-    store = Store(data_dir)
-    iface = cfg["network"]["interface"]
-    scanner = Scanner(iface)
+    store = open_store(cfg.get("app", {}), daemon=True)
+    interfaces = _interfaces(cfg["network"])
+    iface = interfaces[0]["name"]
+    scanners = [
+        Scanner(
+            entry["name"],
+            backend=cfg["network"].get("scan_backend", "auto"),
+            raw_timeout=float(cfg["network"].get("raw_timeout_sec", 1.0)),
+            timeout=float(cfg["network"].get("scan_timeout_sec", 30)),
+        )
+        for entry in interfaces
+    ]
+    full_sweep = cfg["network"].get("full_sweep_interval_sec")
+    scanner = ScannerGroup(
+        scanners,
+        miss_limit=int(cfg["network"].get("leave_after_misses", 2)),
+        full_sweep_interval=float(full_sweep) if full_sweep else None,
+    )
+    fingerprints: Optional[FingerprintIndex] = None
+    if cfg["network"].get("fingerprint_grouping", False):
+        fingerprints = FingerprintIndex()
+        fingerprints.load(store.recent_devices())
+    # interfaz en la que se vio cada MAC por última vez, para elegir el bloqueador
+    # (también se guarda en el store, que es lo que cuenta tras un reinicio)
+    device_iface: Dict[str, str] = {}
 
     block_cfg = cfg.get("block", {})
     block_enable = bool(block_cfg.get("enable", False))
     gateway_ip = block_cfg.get("gateway_ip") or cfg.get("network", {}).get("gateway_ip")
     arp_interval = float(block_cfg.get("arp_interval_sec", 2.0))
 
-    blocker: Optional[ArpSpoofBlocker] = None
+    blockers: Dict[str, ArpSpoofBlocker] = {}
     if block_enable:
-        try:
-            blocker = ArpSpoofBlocker(iface=iface, gateway_ip=gateway_ip, interval=arp_interval)
-        except Exception as exc:
-            logger.error("No se pudo inicializar el bloqueo ARP: %s", exc)
-            block_enable = False
+        for entry in interfaces:
+            try:
+                blockers[entry["name"]] = ArpSpoofBlocker(
+                    iface=entry["name"], gateway_ip=entry.get("gateway_ip") or gateway_ip, interval=arp_interval
+                )
+            except Exception as exc:
+                logger.error("No se pudo inicializar el bloqueo ARP en %s: %s", entry["name"], exc)
+        block_enable = bool(blockers)
 
     async def _apply(mac: str):
-        if not block_enable or blocker is None:
+        if not block_enable:
             return
-        device = store.list_devices().get(mac.upper())
+        device = store.get_device(mac)
         if not device:
             logger.warning("No hay datos para %s, no se puede bloquear.", mac)
             return
+        blocker = blockers.get(device_iface.get(mac.upper()) or device.get("iface") or iface)
+        if blocker is None:
+            logger.warning("No hay bloqueo ARP activo en la interfaz de %s.", mac)
+            return
         ip = device.get("ip")
         try:
             await blocker.block(mac, ip)
@@ -55,12 +102,44 @@ async def main():
             logger.error("Error al aplicar bloqueo a %s: %s", mac, exc)
 
     async def _remove(mac: str):
-        if not block_enable or blocker is None:
+        if not block_enable:
             return
-        try:
-            await blocker.unblock(mac)
-        except Exception as exc:
-            logger.error("Error al quitar bloqueo a %s: %s", mac, exc)
+        for blocker in blockers.values():
+            try:
+                await blocker.unblock(mac)
+            except Exception as exc:
+                logger.error("Error al quitar bloqueo a %s: %s", mac, exc)
+
+    async def _control(op: str, mac: Any, arg: Optional[str]):
+        apply_op(store, op, mac, arg)
+        if op == "block":
+            await _apply(mac)
+        elif op == "unblock":
+            await _remove(mac)
+        elif op == "delete":
+            _forget([m.upper() for m in mac])
+
+    data_dir = cfg.get("app", {}).get("data_dir", "/var/lib/raspsentinel")
+    vendors_cfg = cfg.get("vendors", {})
+    VENDOR_LOOKUP.configure(data_dir, cache_size=int(vendors_cfg.get("cache_size", 4096)))
+    control = ControlServer(data_dir, _control)
+
+    scan_interval = int(cfg["network"].get("scan_interval_sec", 60))
+    passive_cfg = cfg["network"].get("passive", {})
+    passive_enable = bool(passive_cfg.get("enable", False))
+    if passive_enable:
+        # con escucha pasiva el barrido activo solo reconcilia (salidas, equipos silenciosos)
+        scan_interval = int(passive_cfg.get("reconcile_interval_sec", 600))
+    scheduler = AdaptiveScheduler.from_config(cfg["network"].get("schedule", {}), scan_interval)
+    presence_cfg = cfg.get("presence", {})
+    presence = PresenceLog(
+        data_dir,
+        gap_sec=float(presence_cfg.get("gap_sec", 3 * scheduler.longest_interval)),
+        max_intervals=int(presence_cfg.get("max_intervals", 200)),
+        max_ip_events=int(presence_cfg.get("max_ip_events", 50)),
+        max_devices=int(presence_cfg.get("max_devices", 5000)),
+    )
+    presence_save_interval = float(presence_cfg.get("save_interval_sec", 300))
 
     bot = TelegramBot(
         token=cfg["telegram"]["bot_token"],
@@ -68,28 +147,129 @@ async def main():
         store=store,
         block_apply_cb=_apply,
         block_remove_cb=_remove,
+        presence=presence,
     )
 
-    scan_interval = int(cfg["network"].get("scan_interval_sec", 60))
+    async def notify_joined(joined: List[Dict[str, Any]], done: Set[str]):
+        """Avisa de las altas que no están en allowlist ni blocklist.
+
+        Consulta el store una sola vez para todo el lote; las MAC de ``done``
+        ya se avisaron (o descartaron) y cada una procesada se añade a él.
+        """
+        pending = [dev for dev in joined if dev["mac"] not in done]
+        if not pending:
+            return
+        known = store.get_devices([dev["mac"] for dev in pending])
+        for dev in pending:
+            flags = known.get(dev["mac"], {})
+            if not flags.get("allow") and not flags.get("block"):
+                # la huella DHCP se copia fácilmente: ``alias_of`` solo se muestra como pista
+                await bot.notify_new(dev)
+            done.add(dev["mac"])
+
+    async def handle_diff(diff: ScanDiff, announced: Optional[Set[str]] = None):
+        """Aplica un diff de escaneo; el trabajo con el store es proporcional a los cambios.
+
+        Todas las altas y cambios del diff se guardan con un único
+        ``upsert_many``; ``announced`` son las altas ya avisadas por adelantado.
+        """
+        presence.record(diff.joined + diff.changed + diff.unchanged)
+        updated = diff.joined + diff.changed + diff.refreshed
+        if fingerprints is not None:
+            # una petición DHCP de un equipo ya presente puede traer su primera huella
+            updated += [
+                dev
+                for dev in diff.unchanged
+                if dev.get("dhcp_params")
+                and is_randomized(dev["mac"])
+                and not fingerprints.known(dev["mac"], dhcp_fingerprint(dev))
+            ]
+        for dev in updated:
+            classify(dev, fingerprints)
+            if dev.get("iface"):
+                device_iface[dev["mac"]] = dev["iface"]
+        if updated:
+            store.upsert_many(updated)
+        if diff.unchanged:
+            store.touch(dev["mac"] for dev in diff.unchanged)
+        for dev in diff.changed:
+            logger.info("%s cambió de IP: %s -> %s", dev["mac"], dev.get("old_ip"), dev.get("ip"))
+        for dev in diff.left:
+            logger.info("%s (%s) ya no está en la red", dev["mac"], dev.get("ip"))
+        await notify_joined(diff.joined, announced if announced is not None else set())
 
     async def scan_loop():
+        last_presence_save = time.monotonic()
+        announced: Set[str] = set()
+
+        async def early(diff: ScanDiff):
+            # anticipo de un barrido en curso: solo avisos; el ciclo se guarda entero al final
+            for dev in diff.joined:
+                classify(dev, fingerprints)
+            await notify_joined(diff.joined, announced)
+
         while True:
+            churn = 0
+            announced.clear()
             try:
-                seen = scanner.scan()
-                devices = store.list_devices()
-                known_allow = {m for m, d in devices.items() if d.get("allow")}
-                known_block = {m for m, d in devices.items() if d.get("block")}
-
-                for dev in seen:
-                    mac = dev["mac"].upper()
-                    store.upsert_device(mac, dev.get("ip"), dev.get("vendor"))
-                    if mac not in known_allow and mac not in known_block:
-                        await bot.notify_new(dev)
+                diff = await scanner.scan_diff_async(on_change=early)
+                churn = diff.churn
+                await handle_diff(diff, announced)
+                if time.monotonic() - last_presence_save >= presence_save_interval:
+                    await asyncio.to_thread(presence.save)
+                    last_presence_save = time.monotonic()
                 # opcional: purga de "online" es solo a efectos de presentación
             except Exception as e:
                 # registro mínimo a stdout
                 logger.exception("scan error: %s", e)
-            await asyncio.sleep(scan_interval)
+            await asyncio.sleep(scheduler.next_interval(churn))
+
+    async def event_loop(source):
+        """Consume los dispositivos que publica una fuente push (sniffer, netlink)."""
+        source.start()
+        try:
+            while True:
+                dev = await source.queue.get()
+                dev.setdefault("iface", source.iface)
+                dev["vendor"] = Scanner._normalize_vendor(dev["mac"], None)
+                try:
+                    await handle_diff(scanner.tracker.observe(dev))
+                except Exception as exc:
+                    logger.exception("Error procesando evento pasivo: %s", exc)
+        finally:
+            source.stop()
+
+    async def vendor_loop(auto_update: bool, interval: float, stats_interval: float):
+        """Carga los fabricantes fuera del bucle de eventos, registra la caché y refresca la tabla."""
+        await asyncio.to_thread(VENDOR_LOOKUP.load)
+        next_update = time.time()
+        if auto_update:
+            try:
+                next_update = os.path.getmtime(VENDOR_LOOKUP.db_path) + interval
+            except OSError:
+                pass
+        while True:
+            await asyncio.sleep(stats_interval)
+            stats = VENDOR_LOOKUP.stats()
+            logger.info(
+                "Caché de fabricantes: %d/%d entradas, %d aciertos, %d fallos (%.0f%%), %d expulsiones",
+                stats["size"],
+                stats["maxsize"],
+                stats["hits"],
+                stats["misses"],
+                stats["hit_rate"] * 100,
+                stats["evictions"],
+            )
+            if not auto_update or time.time() < next_update:
+                continue
+            next_update = time.time() + interval
+            try:
+                total = await asyncio.to_thread(refresh_database, data_dir)
+                if total:
+                    await asyncio.to_thread(VENDOR_LOOKUP.reload)
+                    logger.info("Tabla de fabricantes actualizada (%d prefijos)", total)
+            except Exception as exc:
+                logger.warning("No se pudo actualizar la tabla de fabricantes: %s", exc)
 
     async def bot_loop():
         await bot.run()
@@ -98,15 +278,58 @@ async def main():
         except asyncio.CancelledError:
             pass
 
+    loops = [
+        bot_loop(),
+        scan_loop(),
+        vendor_loop(
+            bool(vendors_cfg.get("auto_update", False)),
+            float(vendors_cfg.get("update_interval_days", 30)) * 86400,
+            float(vendors_cfg.get("stats_interval_sec", 3600)),
+        ),
+    ]
+    if passive_enable:
+        repeat_sec = float(passive_cfg.get("repeat_sec", 60))
+        loops.extend(event_loop(PassiveSniffer(entry["name"], repeat_sec=repeat_sec)) for entry in interfaces)
+    loops.extend(event_loop(s.neighbours) for s in scanners if s.neighbours is not None)
+
+    def _forget(macs: List[str]):
+        presence.forget(macs)
+        # un dispositivo purgado que sigue en la red vuelve a darse de alta en el próximo escaneo
+        scanner.tracker.forget(macs)
+        for mac in macs:
+            device_iface.pop(mac, None)
+        if fingerprints is not None:
+            fingerprints.forget(macs)
+
+    retention_cfg = cfg.get("retention", {})
+    if retention_cfg.get("enable", False):
+        loops.append(
+            retention_loop(
+                store,
+                RetentionPolicy.from_config(retention_cfg),
+                interval=float(retention_cfg.get("interval_sec", 3600)),
+                batch_size=int(retention_cfg.get("batch_size", 200)),
+                on_pruned=_forget,
+            )
+        )
+
+    # systemd detiene el servicio con SIGTERM: se cancela la tarea para pasar por la limpieza
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
     try:
-        await asyncio.gather(bot_loop(), scan_loop())
+        await control.start()
+        await asyncio.gather(*loops)
+    except asyncio.CancelledError:
+        logger.info("Deteniendo raspsentinel")
     finally:
-        if block_enable and blocker is not None:
+        await control.stop()
+        for blocker in blockers.values():
             await blocker.shutdown()
         try:
             await bot.stop()
         except Exception as exc:  # pragma: no cover - cleanup best-effort
             logger.debug("Error al detener el bot: %s", exc)
+        presence.save()
+        store.close()
 
 
 if __name__ == "__main__":
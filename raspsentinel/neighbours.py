@@ -0,0 +1,249 @@
+"""Tabla de vecinos incremental vía rtnetlink (RTM_NEWNEIGH / RTM_DELNEIGH).
+
+Se suscribe al grupo ``RTMGRP_NEIGH``, carga la tabla una vez con un volcado
+``RTM_GETNEIGH`` y a partir de ahí solo aplica los cambios que envía el
+kernel, sin lanzar ``ip neigh`` ni volver a parsear la tabla completa.
+"""
+from __future__ import annotations
+
+import asyncio
+import errno
+import logging
+import socket
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .arpsweep import format_mac
+
+logger = logging.getLogger(__name__)
+
+NETLINK_ROUTE = 0
+RTMGRP_NEIGH = 0x4
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NDA_DST = 1
+NDA_LLADDR = 2
+
+# estados sin dirección de enlace válida
+NUD_INCOMPLETE = 0x01
+NUD_FAILED = 0x20
+NUD_INVALID = NUD_INCOMPLETE | NUD_FAILED
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+NDMSG = struct.Struct("=BxxxiHBB")
+RTATTR = struct.Struct("=HH")
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def parse_messages(buf: bytes, ifindex: int):
+    """Genera ``(tipo, ip, mac)`` por cada mensaje de vecino IPv4 de ``ifindex``.
+
+    Para ``NLMSG_DONE`` se genera ``(NLMSG_DONE, None, None)``; ``mac`` es
+    ``None`` si la entrada no tiene dirección de enlace utilizable.
+    """
+    pos = 0
+    while pos + NLMSG_HEADER.size <= len(buf):
+        length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(buf, pos)
+        if length < NLMSG_HEADER.size:
+            break
+        body = pos + NLMSG_HEADER.size
+        end = pos + length
+        pos += _align(length)
+        if msg_type == NLMSG_DONE:
+            yield NLMSG_DONE, None, None
+            continue
+        if msg_type == NLMSG_ERROR:
+            (code,) = struct.unpack_from("=i", buf, body)
+            if code:
+                raise OSError(-code, "error de netlink")
+            continue
+        if msg_type not in (RTM_NEWNEIGH, RTM_DELNEIGH) or end - body < NDMSG.size:
+            continue
+        family, index, state, _, _ = NDMSG.unpack_from(buf, body)
+        if family != socket.AF_INET or index != ifindex:
+            continue
+        ip = mac = None
+        attr = body + NDMSG.size
+        while attr + RTATTR.size <= end:
+            rta_len, rta_type = RTATTR.unpack_from(buf, attr)
+            if rta_len < RTATTR.size:
+                break
+            value = buf[attr + RTATTR.size : attr + rta_len]
+            if rta_type == NDA_DST and len(value) == 4:
+                ip = socket.inet_ntoa(value)
+            elif rta_type == NDA_LLADDR and len(value) == 6:
+                mac = format_mac(value)
+            attr += _align(rta_len)
+        if ip is None:
+            continue
+        if state & NUD_INVALID or mac == "00:00:00:00:00:00":
+            mac = None
+        yield msg_type, ip, mac
+
+
+class NeighbourTable:
+    """Copia en memoria de la tabla de vecinos IPv4 de una interfaz.
+
+    El socket se abre y la tabla se vuelca una sola vez, en el primer
+    ``snapshot()`` o al arrancar el hilo lector. Sin hilo, ``snapshot()``
+    aplica los eventos pendientes antes de devolver la tabla; con ``start()``
+    solo lee el hilo, que aplica los eventos según llegan y publica en
+    ``queue`` cada entrada nueva o que cambia de MAC.
+    """
+
+    def __init__(self, iface: str):
+        self.iface = iface
+        self.ifindex: Optional[int] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._table: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # protege el socket: apertura, volcado inicial y lectura sin hilo
+        self._sock_lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_open(self):
+        with self._sock_lock:
+            if self._sock is None:
+                self._open()
+
+    def _open(self):
+        # el índice se resuelve aquí: una VLAN que aún no existe no impide arrancar
+        self.ifindex = socket.if_nametoindex(self.iface)
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.bind((0, RTMGRP_NEIGH))
+            sock.settimeout(1.0)
+            self._sock = sock
+            self._dump()
+        except BaseException:
+            self._sock = None
+            sock.close()
+            raise
+
+    def _dump(self):
+        """Recarga la tabla completa (al abrir y tras perder eventos)."""
+        self._seq += 1
+        ndmsg = NDMSG.pack(socket.AF_INET, 0, 0, 0, 0)
+        header = NLMSG_HEADER.pack(
+            NLMSG_HEADER.size + NDMSG.size, RTM_GETNEIGH, NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0
+        )
+        prev_timeout = self._sock.gettimeout()
+        self._sock.settimeout(5.0)
+        try:
+            self._sock.send(header + ndmsg)
+            fresh: Dict[str, str] = {}
+            done = False
+            while not done:
+                for msg_type, ip, mac in parse_messages(self._sock.recv(65536), self.ifindex):
+                    if msg_type == NLMSG_DONE:
+                        done = True
+                    elif msg_type == RTM_NEWNEIGH and mac:
+                        fresh[ip] = mac
+                    else:
+                        fresh.pop(ip, None)
+        finally:
+            self._sock.settimeout(prev_timeout)
+        with self._lock:
+            added = [(ip, mac) for ip, mac in fresh.items() if self._table.get(ip) != mac]
+            self._table = fresh
+        self._publish(added)
+
+    def _apply(self, buf: bytes):
+        added: List[Tuple[str, str]] = []
+        with self._lock:
+            for msg_type, ip, mac in parse_messages(buf, self.ifindex):
+                if msg_type == RTM_NEWNEIGH and mac:
+                    if self._table.get(ip) != mac:
+                        self._table[ip] = mac
+                        added.append((ip, mac))
+                elif msg_type in (RTM_NEWNEIGH, RTM_DELNEIGH):
+                    self._table.pop(ip, None)
+        self._publish(added)
+
+    def _publish(self, added: List[Tuple[str, str]]):
+        if self._loop is None:
+            return
+        for ip, mac in added:
+            self._loop.call_soon_threadsafe(self.queue.put_nowait, {"ip": ip, "mac": mac, "source": "neigh"})
+
+    def _recv(self) -> Optional[bytes]:
+        try:
+            return self._sock.recv(65536)
+        except (BlockingIOError, socket.timeout):
+            return None
+        except OSError as exc:
+            if exc.errno != errno.ENOBUFS:
+                raise
+            logger.warning("Se perdieron eventos de vecinos en %s; recargando la tabla", self.iface)
+            self._dump()
+            return None
+
+    def snapshot(self) -> List[Dict[str, str]]:
+        self._ensure_open()
+        with self._sock_lock:
+            if self._thread is None:
+                prev_timeout = self._sock.gettimeout()
+                self._sock.setblocking(False)
+                try:
+                    while True:
+                        buf = self._recv()
+                        if buf is None:
+                            break
+                        self._apply(buf)
+                finally:
+                    self._sock.settimeout(prev_timeout)
+        with self._lock:
+            return [{"ip": ip, "mac": mac} for ip, mac in self._table.items()]
+
+    def start(self):
+        """Arranca el hilo lector; la apertura y el volcado se hacen en él, no en el bucle."""
+        self._loop = asyncio.get_running_loop()
+        with self._sock_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"neigh-{self.iface}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        with self._sock_lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._ensure_open()
+                break
+            except OSError as exc:
+                logger.warning("Tabla de vecinos de %s no disponible (%s); reintentando", self.iface, exc)
+                self._stop.wait(5)
+        else:
+            return
+        logger.info("Suscrito a la tabla de vecinos de %s vía netlink", self.iface)
+        while not self._stop.is_set():
+            try:
+                buf = self._recv()
+                if buf:
+                    self._apply(buf)
+            except OSError as exc:
+                logger.error("Error leyendo eventos de vecinos: %s", exc)
+                self._stop.wait(1)
@@ -0,0 +1,258 @@
+"""Tabla de fabricantes por prefijo (MA-L, MA-M y MA-S) con una sola búsqueda.
+
+Las asignaciones del IEEE son bloques alineados de 24, 28 o 36 bits que
+pueden anidarse (un MA-S dentro de un MA-L). ``flatten`` las convierte en
+tramos disjuntos sobre los 36 bits altos de la MAC, donde cada tramo lleva el
+fabricante del prefijo más largo que lo cubre; así la búsqueda es un único
+``bisect`` sin probar longitudes.
+
+Fichero compilado (little-endian)::
+
+    cabecera   "<4sBI": magic b"RSVN", versión, número de tramos
+    registros  "<QI" por tramo ordenado: inicio (36 bits) y offset del nombre
+               en la tabla de cadenas, o NO_VENDOR si el tramo no está asignado
+    cadenas    nombres UTF-8 terminados en NUL (cada uno aparece una vez)
+
+``OuiDatabase`` mapea el fichero con ``mmap`` y solo se leen las páginas que
+se tocan; ``RangeTable`` es la misma estructura en memoria.
+"""
+from __future__ import annotations
+
+import bisect
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .utils import give_to_service
+
+MAGIC = b"RSVN"
+VERSION = 2
+HEADER = struct.Struct("<4sBI")
+RECORD = struct.Struct("<QI")
+NO_VENDOR = 0xFFFFFFFF
+KEY_BITS = 36
+HEX_DIGITS = frozenset("0123456789ABCDEF")
+
+Range = Tuple[int, int, str]
+
+
+def _prefix_range(prefix: str) -> Optional[Tuple[int, int]]:
+    """Tramo ``[inicio, fin]`` de 36 bits que cubre un prefijo hex de 6 a 9 dígitos."""
+    if not 6 <= len(prefix) <= 9 or not HEX_DIGITS.issuperset(prefix):
+        return None
+    shift = KEY_BITS - 4 * len(prefix)
+    start = int(prefix, 16) << shift
+    return start, start + (1 << shift) - 1
+
+
+def iter_registry(path: str) -> Iterator[Range]:
+    """Genera ``(inicio, fin, fabricante)`` de un fichero de registro.
+
+    Acepta el formato de arp-scan (``prefijo<TAB>fabricante``, con prefijos de
+    6, 7 o 9 dígitos) y el del IEEE (``oui.txt``, ``mam.txt``, ``oui36.txt``,
+    ``iab.txt``), donde la línea ``(base 16)`` de MA-M y MA-S da un rango
+    relativo al OUI de la línea ``(hex)`` anterior.
+    """
+    oui = None
+    with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+        for line in fh:
+            if "(hex)" in line:
+                oui = line.partition("(hex)")[0].strip().replace("-", "").upper()
+                continue
+            if "(base 16)" in line:
+                head, _, vendor = line.partition("(base 16)")
+                vendor = vendor.strip()
+                head = head.strip().upper()
+                if "-" in head and oui and len(oui) == 6:
+                    low, _, high = head.partition("-")
+                    try:
+                        base = int(oui, 16) << 24
+                        start, end = (base | int(low, 16)) >> 12, (base | int(high, 16)) >> 12
+                    except ValueError:
+                        continue
+                    if vendor:
+                        yield start, end, vendor
+                    continue
+                span = _prefix_range(head)
+            elif "\t" in line and not line.startswith("#"):
+                head, _, vendor = line.partition("\t")
+                vendor = vendor.strip()
+                span = _prefix_range(head.strip().replace(":", "").replace("-", "").upper())
+            else:
+                continue
+            if span and vendor:
+                yield span[0], span[1], vendor
+
+
+def flatten(entries: Iterable[Range]) -> List[Tuple[int, Optional[str]]]:
+    """Convierte prefijos anidados en tramos disjuntos ``(inicio, fabricante)``.
+
+    Gana el prefijo más largo; con dos definiciones del mismo prefijo gana la
+    última. Los huecos sin asignar quedan como tramos con fabricante ``None``.
+    """
+    out: List[Tuple[int, Optional[str]]] = []
+    pos = 0
+
+    def emit(start: int, end: int, name: Optional[str]):
+        if start > end:
+            return
+        if out and out[-1][1] == name:
+            return
+        out.append((start, name))
+
+    stack: List[Tuple[int, str]] = []
+    for start, end, name in sorted(entries, key=lambda item: (item[0], -item[1])):
+        while stack and stack[-1][0] < start:
+            top_end, top_name = stack.pop()
+            emit(pos, top_end, top_name)
+            pos = top_end + 1
+        if stack:
+            emit(pos, start - 1, stack[-1][1])
+        elif pos < start:
+            emit(pos, start - 1, None)
+        stack.append((end, name))
+        pos = start
+    while stack:
+        top_end, top_name = stack.pop()
+        emit(pos, top_end, top_name)
+        pos = top_end + 1
+    if out and pos < (1 << KEY_BITS):
+        emit(pos, (1 << KEY_BITS) - 1, None)
+    return out
+
+
+def _key(clean: str) -> Optional[int]:
+    """Clave de 36 bits de una MAC en hex sin separadores."""
+    if len(clean) < 9:
+        return None
+    try:
+        return int(clean[:9], 16)
+    except ValueError:
+        return None
+
+
+OUI_SPAN = (1 << (KEY_BITS - 24)) - 1
+
+
+def _find(keys: Sequence[int], key: int) -> Tuple[int, bool]:
+    """Índice del tramo que contiene ``key`` y si ese tramo cubre el OUI entero.
+
+    Un OUI sin subdivisiones MA-M/MA-S cae en un solo tramo, así que su
+    fabricante vale para todas las MAC que empiezan por él.
+    """
+    idx = bisect.bisect_right(keys, key) - 1
+    block_start = key & ~OUI_SPAN
+    block_end = key | OUI_SPAN
+    starts_before = idx < 0 or keys[idx] <= block_start
+    ends_after = idx + 1 >= len(keys) or keys[idx + 1] > block_end
+    return idx, starts_before and ends_after
+
+
+def compile_db(sources: Iterable[str], output: str) -> int:
+    """Compila los ficheros ``sources`` en ``output`` y devuelve el número de prefijos."""
+    entries: List[Range] = []
+    for path in sources:
+        if os.path.exists(path):
+            entries.extend(iter_registry(path))
+    ranges = flatten(entries)
+
+    offsets: Dict[str, int] = {}
+    blob = bytearray()
+    records = bytearray()
+    for start, vendor in ranges:
+        if vendor is None:
+            records += RECORD.pack(start, NO_VENDOR)
+            continue
+        offset = offsets.get(vendor)
+        if offset is None:
+            offset = offsets[vendor] = len(blob)
+            blob += vendor.replace("\0", "").encode("utf-8") + b"\0"
+        records += RECORD.pack(start, offset)
+
+    payload = HEADER.pack(MAGIC, VERSION, len(ranges)) + bytes(records) + bytes(blob)
+    tmp = output + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(payload)
+        fh.flush()
+        os.fsync(fh.fileno())
+        give_to_service(tmp, fh.fileno())
+    os.replace(tmp, output)
+    return len(entries)
+
+
+class RangeTable:
+    """Tramos de ``flatten`` en memoria (cuando no hay tabla compilada)."""
+
+    def __init__(self, ranges: Sequence[Tuple[int, Optional[str]]]):
+        self._starts = [start for start, _ in ranges]
+        self._names = [name for _, name in ranges]
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def lookup(self, clean: str) -> Optional[str]:
+        return self.lookup_span(clean)[0]
+
+    def lookup_span(self, clean: str) -> Tuple[Optional[str], bool]:
+        """Como ``lookup`` y además si el resultado vale para todo el OUI."""
+        key = _key(clean)
+        if key is None:
+            return None, False
+        idx, whole_oui = _find(self._starts, key)
+        return (self._names[idx] if idx >= 0 else None), whole_oui
+
+
+class _Keys:
+    """Vista de solo lectura de los inicios de tramo del fichero (para ``bisect``)."""
+
+    def __init__(self, buf: mmap.mmap, count: int):
+        self._buf = buf
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> int:
+        return RECORD.unpack_from(self._buf, HEADER.size + index * RECORD.size)[0]
+
+
+class OuiDatabase:
+    """Lector de la tabla compilada por ``compile_db``."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} no es una tabla de fabricantes de raspsentinel")
+        if version != VERSION:
+            self._mm.close()
+            raise ValueError(f"versión de tabla de fabricantes no soportada: {version} (ejecuta 'vendors compile')")
+        self._keys = _Keys(self._mm, count)
+        self._blob = HEADER.size + count * RECORD.size
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def lookup(self, clean: str) -> Optional[str]:
+        """Fabricante para una MAC en hex sin separadores."""
+        return self.lookup_span(clean)[0]
+
+    def lookup_span(self, clean: str) -> Tuple[Optional[str], bool]:
+        """Como ``lookup`` y además si el resultado vale para todo el OUI."""
+        key = _key(clean)
+        if key is None:
+            return None, False
+        idx, whole_oui = _find(self._keys, key)
+        if idx < 0:
+            return None, whole_oui
+        _, offset = RECORD.unpack_from(self._mm, HEADER.size + idx * RECORD.size)
+        if offset == NO_VENDOR:
+            return None, whole_oui
+        pos = self._blob + offset
+        return self._mm[pos : self._mm.find(b"\0", pos)].decode("utf-8"), whole_oui
+
+    def close(self):
+        self._mm.close()
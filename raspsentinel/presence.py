@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceLog:
+    """Histórico compacto de presencia por MAC.
+
+    Cada MAC guarda intervalos ``[inicio, fin]`` (epoch en segundos) codificados
+    por tramos: una detección dentro de ``gap_sec`` del final del último tramo
+    lo alarga en lugar de añadir un punto. También se guardan los cambios de IP
+    como eventos ``[ts, ip]``. La memoria está acotada: al superar
+    ``max_intervals`` se fusionan por parejas los tramos más antiguos
+    (reduciendo su resolución) y al superar ``max_devices`` se descarta la MAC
+    inactiva desde hace más tiempo.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        gap_sec: float = 180.0,
+        max_intervals: int = 200,
+        max_ip_events: int = 50,
+        max_devices: int = 5000,
+    ):
+        self.path = os.path.join(data_dir, "presence.json")
+        self.gap_sec = float(gap_sec)
+        self.max_intervals = max(2, int(max_intervals))
+        self.max_ip_events = max(1, int(max_ip_events))
+        self.max_devices = max(1, int(max_devices))
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, List[List[Any]]]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.error("No se pudo leer %s: %s", self.path, exc)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._data, separators=(",", ":"))
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, self.path)
+
+    def record(self, seen: Iterable[Dict[str, Any]], ts: Optional[float] = None):
+        """Registra las MAC detectadas en un ciclo de escaneo."""
+        now = int(ts if ts is not None else time.time())
+        with self._lock:
+            for dev in seen:
+                mac = dev["mac"].upper()
+                entry = self._data.get(mac)
+                if entry is None:
+                    entry = self._data[mac] = {"on": [], "ips": []}
+                on = entry["on"]
+                if on and now - on[-1][1] <= self.gap_sec:
+                    on[-1][1] = now
+                else:
+                    on.append([now, now])
+                    if len(on) > self.max_intervals:
+                        self._downsample(on)
+                ip = dev.get("ip")
+                ips = entry["ips"]
+                if ip and (not ips or ips[-1][1] != ip):
+                    ips.append([now, ip])
+                    del ips[: -self.max_ip_events]
+            if len(self._data) > self.max_devices:
+                self._evict()
+            self._dirty = True
+
+    @staticmethod
+    def _downsample(on: List[List[int]]):
+        """Fusiona por parejas la mitad más antigua de los tramos."""
+        half = len(on) // 2
+        merged = [[on[i][0], on[min(i + 1, half - 1)][1]] for i in range(0, half, 2)]
+        on[:half] = merged
+
+    def _evict(self):
+        excess = len(self._data) - self.max_devices
+        oldest = sorted(self._data.items(), key=lambda item: item[1]["on"][-1][1] if item[1]["on"] else 0)
+        for mac, _ in oldest[:excess]:
+            del self._data[mac]
+
+    def forget(self, macs: Iterable[str]):
+        with self._lock:
+            for mac in macs:
+                if self._data.pop(mac.upper(), None) is not None:
+                    self._dirty = True
+
+    def intervals(self, mac: str) -> List[Tuple[int, int]]:
+        entry = self._data.get(mac.upper())
+        return [tuple(span) for span in entry["on"]] if entry else []
+
+    def ip_history(self, mac: str) -> List[Tuple[int, str]]:
+        entry = self._data.get(mac.upper())
+        return [tuple(event) for event in entry["ips"]] if entry else []
+
+    def summary(self, mac: str, limit: int = 5) -> List[str]:
+        """Líneas legibles con los últimos tramos de conexión y cambios de IP."""
+        lines: List[str] = []
+        for start, end in reversed(self.intervals(mac)[-limit:]):
+            lines.append(f"{_fmt_ts(start)} → {_fmt_ts(end)} ({_fmt_duration(end - start)})")
+        ips = self.ip_history(mac)[-limit:]
+        if len(ips) > 1:
+            lines.extend(f"IP {ip} desde {_fmt_ts(ts)}" for ts, ip in reversed(ips))
+        return lines
+
+
+def _fmt_ts(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+
+def _fmt_duration(seconds: int) -> str:
+    if seconds < 60:
+        return "<1m"
+    hours, rem = divmod(seconds // 60, 60)
+    if hours >= 24:
+        return f"{hours // 24}d{hours % 24}h"
+    if hours:
+        return f"{hours}h{rem:02d}m"
+    return f"{rem}m"
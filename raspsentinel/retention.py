@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Qué dispositivos se olvidan del historial.
+
+    Los dispositivos en allowlist o blocklist se conservan siempre salvo que
+    ``keep_flagged`` sea ``False``. Las MAC aleatorias (``randomized``) rotan
+    y no vuelven, así que pueden caducar antes con ``randomized_max_age_days``.
+    """
+
+    new_max_age_days: Optional[float] = 30.0
+    max_entries: Optional[int] = None
+    keep_flagged: bool = True
+    randomized_max_age_days: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "RetentionPolicy":
+        age = cfg.get("new_max_age_days", 30)
+        cap = cfg.get("max_entries")
+        randomized_age = cfg.get("randomized_max_age_days")
+        return cls(
+            new_max_age_days=float(age) if age is not None else None,
+            max_entries=int(cap) if cap is not None else None,
+            keep_flagged=bool(cfg.get("keep_flagged", True)),
+            randomized_max_age_days=float(randomized_age) if randomized_age is not None else None,
+        )
+
+
+def select_expired(
+    devices: Iterable[Tuple[str, Dict[str, Any]]],
+    policy: RetentionPolicy,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """Devuelve las MAC a purgar, de la más antigua a la más reciente."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = (
+        (now - timedelta(days=policy.new_max_age_days)).isoformat()
+        if policy.new_max_age_days is not None
+        else None
+    )
+    randomized_cutoff = (
+        (now - timedelta(days=policy.randomized_max_age_days)).isoformat()
+        if policy.randomized_max_age_days is not None
+        else cutoff
+    )
+    candidates: List[Tuple[str, str, Optional[str]]] = []
+    total = 0
+    for mac, dev in devices:
+        total += 1
+        if policy.keep_flagged and (dev.get("allow") or dev.get("block")):
+            continue
+        seen = dev.get("last_seen") or dev.get("first_seen")
+        if not seen:
+            continue
+        candidates.append((seen, mac, randomized_cutoff if dev.get("randomized") else cutoff))
+    candidates.sort()
+    expired = [mac for seen, mac, limit in candidates if limit is not None and seen < limit]
+    if policy.max_entries is not None:
+        excess = total - len(expired) - policy.max_entries
+        if excess > 0:
+            gone = set(expired)
+            expired += [mac for _, mac, _ in candidates if mac not in gone][:excess]
+    return expired
+
+
+async def retention_loop(
+    store,
+    policy: RetentionPolicy,
+    interval: float,
+    batch_size: int = 200,
+    on_pruned: Optional[Callable[[List[str]], None]] = None,
+):
+    """Purga periódica en lotes pequeños para no bloquear el bucle de eventos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = select_expired(store.recent_devices(), policy)
+            for start in range(0, len(expired), batch_size):
+                batch = expired[start : start + batch_size]
+                store.delete_devices(batch)
+                if on_pruned is not None:
+                    on_pruned(batch)
+                await asyncio.sleep(0)
+            if expired:
+                logger.info("Retención: %d dispositivos purgados", len(expired))
+        except Exception as exc:
+            logger.exception("Error en la purga de retención: %s", exc)
@@ -1,41 +1,165 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import re
-from typing import Dict, List
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
-from .utils import has_cmd, run
+from . import arpsweep
+from .classify import is_randomized
+from .neighbours import NeighbourTable
+from .utils import aclosing, has_cmd, run, run_async, stream_lines
 from .vendors import VENDOR_LOOKUP
 
+logger = logging.getLogger(__name__)
+
 
-ARP_RE = re.compile(r"^(?P<ip>\d+\.\d+\.\d+\.\d+)\s+(?P<mac>[0-9a-f:]{17})\s+(?P<vendor>.+)$", re.I)
 IPN_RE = re.compile(r"^(?P<ip>\d+\.\d+\.\d+\.\d+) dev \S+ lladdr (?P<mac>[0-9a-f:]{17}) ")
 
 
+BACKENDS = ("auto", "arp-scan", "ip-neigh", "raw", "netlink")
+
+
+def parse_arp_scan_line(line: str) -> Optional[Tuple[str, str, str]]:
+    """Tokeniza una línea de ``arp-scan --plain`` (``ip<TAB>mac<TAB>fabricante``).
+
+    Devuelve ``(ip, MAC en mayúsculas, fabricante)`` o ``None`` si la línea no
+    tiene ese formato. Si no hay tabuladores se separa por espacios.
+    """
+    parts = line.strip().split("\t", 2)
+    if len(parts) < 2:
+        parts = line.split(None, 2)
+        if len(parts) < 2:
+            return None
+    ip, mac = parts[0].strip(), parts[1].strip()
+    if len(mac) != 17 or mac.count(":") != 5 or ip.count(".") != 3 or not ip[:1].isdigit():
+        return None
+    return ip, mac.upper(), parts[2].strip() if len(parts) > 2 else ""
+
+
 class Scanner:
-    def __init__(self, iface: str):
+    def __init__(self, iface: str, backend: str = "auto", raw_timeout: float = 1.0, timeout: float = 15.0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de escaneo desconocido: {backend}")
         self.iface = iface
+        self.backend = backend
+        self.raw_timeout = raw_timeout
+        self.timeout = timeout
+        self.neighbours: Optional[NeighbourTable] = NeighbourTable(iface) if backend == "netlink" else None
 
     def scan(self) -> List[Dict[str, str]]:
-        if has_cmd("arp-scan"):
+        if self.backend == "raw":
+            return self._scan_raw()
+        if self.backend == "netlink":
+            return self._scan_netlink()
+        if self.backend == "ip-neigh":
+            return self._scan_ip_neigh()
+        if self._uses_arp_scan():
             return self._scan_arp_scan()
         else:
             return self._scan_ip_neigh()
 
+    def _uses_arp_scan(self) -> bool:
+        return self.backend == "arp-scan" or (self.backend == "auto" and has_cmd("arp-scan"))
+
+    def streams(self) -> bool:
+        """``True`` si ``stream_async`` entrega los dispositivos según se descubren."""
+        return self._uses_arp_scan()
+
+    async def scan_async(self) -> List[Dict[str, str]]:
+        """Versión no bloqueante de ``scan`` para el bucle del servicio.
+
+        Los backends basados en comandos usan un subproceso asyncio que se mata
+        al vencer ``timeout`` o al cancelar la tarea; el resto (barrido raw,
+        netlink y búsqueda de fabricantes) se ejecuta en un hilo.
+        """
+        if self.backend in ("raw", "netlink"):
+            return await asyncio.wait_for(asyncio.to_thread(self.scan), self.timeout)
+        if self._uses_arp_scan():
+            out = await run_async(self._arp_scan_cmd(), timeout=self.timeout)
+            return await asyncio.to_thread(self._parse_arp_scan, out)
+        out = await run_async(self._ip_neigh_cmd(), timeout=self.timeout)
+        return await asyncio.to_thread(self._parse_ip_neigh, out)
+
+    async def probe_async(self, targets: List[Tuple[str, Optional[str]]]) -> List[Dict[str, str]]:
+        """Sondea solo ``targets`` (``(ip, mac)`` conocidos) en lugar de toda la subred.
+
+        El barrido raw envía las peticiones ARP en unicast a la MAC conocida y
+        arp-scan recibe la lista de IPs; ip-neigh y netlink no generan tráfico,
+        así que hacen su lectura habitual.
+        """
+        if not targets:
+            return []
+        if self.backend == "raw":
+            return await asyncio.wait_for(asyncio.to_thread(self._scan_raw, targets), self.timeout)
+        if self._uses_arp_scan():
+            out = await run_async(self._arp_scan_cmd([ip for ip, _ in targets]), timeout=self.timeout)
+            return await asyncio.to_thread(self._parse_arp_scan, out)
+        return await self.scan_async()
+
+    async def stream_async(
+        self, targets: Optional[List[Tuple[str, Optional[str]]]] = None
+    ) -> AsyncIterator[Dict[str, str]]:
+        """Genera los dispositivos según se descubren (todos, o solo ``targets``).
+
+        Con arp-scan cada línea se procesa en cuanto el proceso la escribe, de
+        modo que el primer dispositivo nuevo no espera al final del barrido; el
+        resto de backends entrega su resultado completo de una vez.
+        """
+        if targets is not None and not targets:
+            return
+        if not self._uses_arp_scan():
+            results = await (self.scan_async() if targets is None else self.probe_async(targets))
+            for dev in results:
+                yield dev
+            return
+        cmd = self._arp_scan_cmd([ip for ip, _ in targets] if targets is not None else None)
+        async with aclosing(stream_lines(cmd, timeout=self.timeout)) as lines:
+            async for line in lines:
+                parsed = parse_arp_scan_line(line)
+                if parsed:
+                    ip, mac, vendor = parsed
+                    yield {"ip": ip, "mac": mac, "vendor": self._normalize_vendor(mac, vendor)}
+
+    def _scan_raw(self, targets: Optional[List[Tuple[str, Optional[str]]]] = None) -> List[Dict[str, str]]:
+        res = []
+        for dev in arpsweep.sweep(self.iface, timeout=self.raw_timeout, targets=targets):
+            mac = dev["mac"]
+            res.append({"ip": dev["ip"], "mac": mac, "vendor": self._normalize_vendor(mac, None)})
+        return res
+
+    def _scan_netlink(self) -> List[Dict[str, str]]:
+        res = []
+        for dev in self.neighbours.snapshot():
+            mac = dev["mac"]
+            res.append({"ip": dev["ip"], "mac": mac, "vendor": self._normalize_vendor(mac, None)})
+        return res
+
+    def _arp_scan_cmd(self, hosts: Optional[List[str]] = None) -> List[str]:
+        cmd = ["arp-scan", "--interface", self.iface, "--plain", "--ignoredups"]
+        return cmd + hosts if hosts else cmd + ["--localnet"]
+
+    def _ip_neigh_cmd(self) -> List[str]:
+        return ["ip", "neigh", "show", "dev", self.iface]
+
     def _scan_arp_scan(self) -> List[Dict[str, str]]:
-        out = run(["arp-scan", "--interface", self.iface, "--localnet", "--plain", "--ignoredups"])
+        return self._parse_arp_scan(run(self._arp_scan_cmd(), timeout=int(self.timeout)))
+
+    def _parse_arp_scan(self, out: str) -> List[Dict[str, str]]:
         res = []
         for line in out.splitlines():
-            m = ARP_RE.match(line.strip())
-            if m:
-                ip = m.group("ip")
-                mac = m.group("mac").upper()
-                vendor = m.group("vendor").strip()
-                vendor = self._normalize_vendor(mac, vendor)
-                res.append({"ip": ip, "mac": mac, "vendor": vendor})
+            parsed = parse_arp_scan_line(line)
+            if parsed:
+                ip, mac, vendor = parsed
+                res.append({"ip": ip, "mac": mac, "vendor": self._normalize_vendor(mac, vendor)})
         return res
 
     def _scan_ip_neigh(self) -> List[Dict[str, str]]:
-        out = run(["ip", "neigh", "show", "dev", self.iface])
+        return self._parse_ip_neigh(run(self._ip_neigh_cmd(), timeout=int(self.timeout)))
+
+    def _parse_ip_neigh(self, out: str) -> List[Dict[str, str]]:
         res = []
         for line in out.splitlines():
             m = IPN_RE.match(line.strip())
@@ -48,8 +172,216 @@ class Scanner:
 
     @staticmethod
     def _normalize_vendor(mac: str, vendor: str | None) -> str | None:
+        if is_randomized(mac):
+            # ninguna MAC aleatoria tiene OUI; arp-scan solo dice "locally administered"
+            return None
         if vendor:
             text = vendor.strip()
             if text and text.lower() not in {"unknown", "(unknown)"}:
                 return text
         return VENDOR_LOOKUP.lookup(mac)
+
+
+@dataclass
+class ScanDiff:
+    """Cambios respecto al estado anterior: altas, bajas, cambios de IP y sin cambios.
+
+    ``refreshed`` es el subconjunto de ``unchanged`` cuyo fabricante se ha
+    resuelto desde la última vez (por ejemplo, visto mientras aún se cargaba
+    la tabla de fabricantes) y que hay que volver a guardar.
+    """
+
+    joined: List[Dict[str, Any]] = field(default_factory=list)
+    left: List[Dict[str, Any]] = field(default_factory=list)
+    changed: List[Dict[str, Any]] = field(default_factory=list)
+    unchanged: List[Dict[str, Any]] = field(default_factory=list)
+    refreshed: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def churn(self) -> int:
+        return len(self.joined) + len(self.left) + len(self.changed)
+
+
+class ScanTracker:
+    """Guarda los dispositivos presentes y calcula el ``ScanDiff`` de cada ciclo.
+
+    Un dispositivo se da por ido tras ``miss_limit`` ciclos seguidos sin verlo,
+    para que una respuesta ARP perdida no genere una baja y un alta.
+    """
+
+    def __init__(self, miss_limit: int = 2):
+        self.miss_limit = max(1, miss_limit)
+        self.present: Dict[str, Dict[str, Any]] = {}
+        self._misses: Dict[str, int] = {}
+
+    def update(self, seen: Iterable[Dict[str, Any]]) -> ScanDiff:
+        """Diff de un escaneo completo."""
+        diff = ScanDiff()
+        current = set()
+        for dev in seen:
+            current.add(self._classify(dev, diff))
+        for mac in [m for m in self.present if m not in current]:
+            misses = self._misses.get(mac, 0) + 1
+            if misses >= self.miss_limit:
+                diff.left.append(self.present.pop(mac))
+                self._misses.pop(mac, None)
+            else:
+                self._misses[mac] = misses
+        return diff
+
+    def forget(self, macs: Iterable[str]):
+        """Olvida MAC purgadas del store para que vuelvan a contar como altas."""
+        for mac in macs:
+            self.present.pop(mac.upper(), None)
+            self._misses.pop(mac.upper(), None)
+
+    def preview(self, dev: Dict[str, Any]) -> ScanDiff:
+        """Qué supondría ``dev`` (alta o cambio de IP) sin modificar el estado."""
+        diff = ScanDiff()
+        prev = self.present.get(dev["mac"].upper())
+        if prev is None:
+            diff.joined.append(dev)
+        elif prev.get("ip") != dev.get("ip"):
+            diff.changed.append(dict(dev, old_ip=prev.get("ip")))
+        return diff
+
+    def observe(self, dev: Dict[str, Any]) -> ScanDiff:
+        """Diff de un único dispositivo visto fuera del ciclo (escucha pasiva, netlink)."""
+        diff = ScanDiff()
+        self._classify(dev, diff)
+        return diff
+
+    def _classify(self, dev: Dict[str, Any], diff: ScanDiff) -> str:
+        mac = dev["mac"] = dev["mac"].upper()
+        self._misses.pop(mac, None)
+        prev = self.present.get(mac)
+        self.present[mac] = dev
+        if prev is None:
+            diff.joined.append(dev)
+        elif prev.get("ip") != dev.get("ip"):
+            dev["old_ip"] = prev.get("ip")
+            diff.changed.append(dev)
+        else:
+            diff.unchanged.append(dev)
+            if dev.get("vendor") and not prev.get("vendor"):
+                diff.refreshed.append(dev)
+        return mac
+
+
+class ScannerGroup:
+    """Escanea varias interfaces en paralelo y fusiona los resultados.
+
+    Cada dispositivo lleva la clave ``iface`` con la interfaz en la que se vio;
+    si una MAC aparece en varias se conserva la primera según el orden de
+    ``scanners``. El fallo de una interfaz no descarta el resto.
+
+    Con ``full_sweep_interval`` los ciclos intermedios solo sondean los
+    dispositivos presentes y el barrido completo de la subred (que descubre
+    equipos nuevos) se hace como mucho una vez por intervalo.
+    """
+
+    def __init__(self, scanners: List[Scanner], miss_limit: int = 2, full_sweep_interval: Optional[float] = None):
+        self.scanners = scanners
+        self.tracker = ScanTracker(miss_limit)
+        self.full_sweep_interval = full_sweep_interval
+        self._last_full: Optional[float] = None
+
+    async def scan_diff_async(self, on_change: Optional[Callable[[ScanDiff], Awaitable[None]]] = None) -> ScanDiff:
+        """Ejecuta un ciclo y devuelve su diff.
+
+        Con ``on_change``, en los backends que generan resultados según llegan
+        (arp-scan), cada alta o cambio de IP se anuncia en cuanto aparece para
+        avisar cuanto antes. Es solo un anticipo: el estado no cambia hasta el
+        final y el diff devuelto incluye igualmente todas las altas y cambios
+        del ciclo, de modo que se guardan con una única escritura. Las
+        entregas corren en una tarea aparte (agrupando lo acumulado) para que
+        un ``on_change`` lento no frene el barrido ni consuma su ``timeout``,
+        y un error en ``on_change`` se registra sin cortarlo.
+        """
+        now = time.monotonic()
+        if (
+            self.full_sweep_interval is None
+            or self._last_full is None
+            or now - self._last_full >= self.full_sweep_interval
+        ):
+            targets = None
+            self._last_full = now
+        else:
+            targets = self._probe_targets()
+        merged: Dict[str, Dict[str, str]] = {}
+        early: Optional[asyncio.Queue] = None
+        notifier = None
+        if on_change is not None:
+            early = asyncio.Queue()
+            notifier = asyncio.create_task(self._deliver(early, on_change))
+        try:
+            results = await asyncio.gather(
+                *(
+                    self._collect(s, s.stream_async(None if targets is None else targets[s.iface]), merged, early)
+                    for s in self.scanners
+                ),
+                return_exceptions=True,
+            )
+        except BaseException:
+            if notifier is not None:
+                notifier.cancel()
+            raise
+        if notifier is not None:
+            early.put_nowait(None)
+            await notifier
+        for scanner, res in zip(self.scanners, results):
+            if isinstance(res, asyncio.CancelledError):
+                raise res
+            if isinstance(res, asyncio.TimeoutError):
+                logger.warning("El escaneo de %s superó %g s y se canceló", scanner.iface, scanner.timeout)
+            elif isinstance(res, BaseException):
+                logger.error("Error escaneando %s: %s", scanner.iface, res)
+        return self.tracker.update(merged.values())
+
+    def _probe_targets(self) -> Dict[str, List[Tuple[str, Optional[str]]]]:
+        """Dispositivos presentes a re-sondear, agrupados por interfaz."""
+        targets: Dict[str, List[Tuple[str, Optional[str]]]] = {s.iface: [] for s in self.scanners}
+        default = self.scanners[0].iface
+        for mac, dev in self.tracker.present.items():
+            if dev.get("ip"):
+                targets.setdefault(dev.get("iface") or default, []).append((dev["ip"], mac))
+        return targets
+
+    async def _collect(self, scanner: Scanner, source, merged, early: Optional[asyncio.Queue]):
+        # los backends que lo devuelven todo de una vez no tienen nada que anticipar
+        if early is not None and not scanner.streams():
+            early = None
+        async with aclosing(source) as devices:
+            async for dev in devices:
+                dev["iface"] = scanner.iface
+                mac = dev["mac"] = dev["mac"].upper()
+                if mac in merged:
+                    continue
+                merged[mac] = dev
+                if early is not None:
+                    diff = self.tracker.preview(dev)
+                    if diff.churn:
+                        early.put_nowait(diff)
+
+    @staticmethod
+    async def _deliver(early: asyncio.Queue, on_change: Callable[[ScanDiff], Awaitable[None]]):
+        """Entrega los diffs anticipados, agrupando los acumulados, hasta recibir ``None``."""
+        done = False
+        while not done:
+            batch = ScanDiff()
+            item = await early.get()
+            while True:
+                if item is None:
+                    done = True
+                    break
+                batch.joined += item.joined
+                batch.changed += item.changed
+                if early.empty():
+                    break
+                item = early.get_nowait()
+            if not batch.churn:
+                continue
+            try:
+                await on_change(batch)
+            except Exception as exc:
+                logger.exception("Error procesando cambios del escaneo: %s", exc)
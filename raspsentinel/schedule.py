@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime
+from typing import Any, Dict, List, Optional
+
+
+def _parse_time(text: str) -> dtime:
+    hours, minutes = str(text).split(":")
+    return dtime(int(hours), int(minutes))
+
+
+@dataclass
+class ScheduleProfile:
+    """Límites de intervalo para una franja horaria (puede cruzar medianoche)."""
+
+    start: dtime
+    end: dtime
+    min_interval: float
+    max_interval: float
+
+    def matches(self, now: dtime) -> bool:
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        return now >= self.start or now < self.end
+
+
+@dataclass
+class AdaptiveScheduler:
+    """Intervalo entre escaneos que se adapta a la actividad de la red.
+
+    Tras un ciclo con cambios (altas, bajas o cambios de IP) vuelve al mínimo;
+    en ciclos tranquilos se multiplica por ``backoff`` hasta el máximo. Los
+    límites los fija el primer perfil horario que coincida o, si ninguno, los
+    globales.
+    """
+
+    min_interval: float
+    max_interval: float
+    backoff: float = 2.0
+    profiles: List[ScheduleProfile] = field(default_factory=list)
+    _interval: Optional[float] = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], default_interval: float) -> "AdaptiveScheduler":
+        """Sin ``network.schedule`` el intervalo es fijo (``default_interval``)."""
+        low = float(cfg.get("min_interval_sec", default_interval))
+        high = float(cfg.get("max_interval_sec", default_interval))
+        profiles = [
+            ScheduleProfile(
+                start=_parse_time(p["start"]),
+                end=_parse_time(p["end"]),
+                min_interval=float(p.get("min_interval_sec", low)),
+                max_interval=float(p.get("max_interval_sec", high)),
+            )
+            for p in cfg.get("profiles", [])
+        ]
+        return cls(
+            min_interval=low,
+            max_interval=max(low, high),
+            backoff=float(cfg.get("backoff", 2.0)),
+            profiles=profiles,
+        )
+
+    @property
+    def longest_interval(self) -> float:
+        return max([self.max_interval] + [p.max_interval for p in self.profiles])
+
+    def bounds(self, now: Optional[datetime] = None) -> tuple[float, float]:
+        clock = (now or datetime.now()).time()
+        for profile in self.profiles:
+            if profile.matches(clock):
+                return profile.min_interval, max(profile.min_interval, profile.max_interval)
+        return self.min_interval, self.max_interval
+
+    def next_interval(self, churn: int, now: Optional[datetime] = None) -> float:
+        """Segundos hasta el próximo escaneo tras un ciclo con ``churn`` cambios."""
+        low, high = self.bounds(now)
+        if churn or self._interval is None:
+            interval = low
+        else:
+            interval = self._interval * self.backoff
+        self._interval = min(max(interval, low), high)
+        return self._interval
+
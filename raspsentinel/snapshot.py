@@ -0,0 +1,132 @@
+"""Formato binario compacto para el snapshot de dispositivos.
+
+Estructura (little-endian)::
+
+    cabecera   "<4sBIII": magic b"RSNT", versión, bytes de meta, bytes de
+               la tabla de cadenas, número de registros
+    meta       JSON con las claves de primer nivel distintas de "devices"
+    cadenas    UTF-8 separadas por NUL; cada cadena distinta aparece una vez
+               (fabricantes, IPs repetidas, claves extra...)
+    registros  "<8IB" por dispositivo: índices (1-based, 0 = None) de mac,
+               name, ip, vendor, first_seen, last_seen, notes y JSON con
+               campos extra, más un byte de flags (bit0 allow, bit1 block)
+
+La decodificación usa ``struct.iter_unpack`` y ``str.split`` para que el
+trabajo por registro en Python sea mínimo. Los extra suelen repetirse
+(``{"iface":"eth0"}``...), así que su JSON se serializa y parsea una vez por
+combinación distinta y no una vez por registro.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, List, Optional
+
+MAGIC = b"RSNT"
+VERSION = 1
+HEADER = struct.Struct("<4sBIII")
+RECORD = struct.Struct("<8IB")
+STRING_FIELDS = ("name", "ip", "vendor", "first_seen", "last_seen", "notes")
+KNOWN_FIELDS = frozenset(STRING_FIELDS + ("allow", "block"))
+
+FLAG_ALLOW = 1
+FLAG_BLOCK = 2
+
+
+def is_binary(buf: bytes) -> bool:
+    return buf[:4] == MAGIC
+
+
+def _flat(extra: Dict[str, Any]) -> Optional[tuple]:
+    """Clave de memo para ``extra`` si todos sus valores son escalares.
+
+    Incluye el tipo de cada valor: ``True == 1`` y no deben compartir JSON.
+    """
+    key = []
+    for name, value in extra.items():
+        if isinstance(value, (list, dict)):
+            return None
+        key.append((name, type(value), value))
+    return tuple(key)
+
+
+def encode(data: Dict[str, Any]) -> bytes:
+    index: Dict[str, int] = {}
+    strings: List[str] = []
+
+    def intern(value: Any) -> int:
+        if value is None:
+            return 0
+        text = str(value).replace("\0", "")
+        idx = index.get(text)
+        if idx is None:
+            strings.append(text)
+            idx = index[text] = len(strings)
+        return idx
+
+    def intern_extra(extra: Dict[str, Any]) -> int:
+        key = _flat(extra)
+        idx = dumped.get(key) if key is not None else None
+        if idx is None:
+            idx = intern(json.dumps(extra, ensure_ascii=False, separators=(",", ":")))
+            if key is not None:
+                dumped[key] = idx
+        return idx
+
+    dumped: Dict[tuple, int] = {}
+    records = bytearray()
+    devices = data.get("devices", {})
+    for mac, dev in devices.items():
+        extra = {k: v for k, v in dev.items() if k not in KNOWN_FIELDS}
+        flags = (FLAG_ALLOW if dev.get("allow") else 0) | (FLAG_BLOCK if dev.get("block") else 0)
+        records += RECORD.pack(
+            intern(mac),
+            *(intern(dev.get(key)) for key in STRING_FIELDS),
+            intern_extra(extra) if extra else 0,
+            flags,
+        )
+    meta = json.dumps({k: v for k, v in data.items() if k != "devices"}, separators=(",", ":")).encode()
+    blob = "\0".join(strings).encode("utf-8")
+    return HEADER.pack(MAGIC, VERSION, len(meta), len(blob), len(devices)) + meta + blob + bytes(records)
+
+
+def decode(buf: bytes) -> Dict[str, Any]:
+    magic, version, meta_len, blob_len, count = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("no es un snapshot binario de raspsentinel")
+    if version != VERSION:
+        raise ValueError(f"versión de snapshot no soportada: {version}")
+    pos = HEADER.size
+    data: Dict[str, Any] = json.loads(buf[pos : pos + meta_len])
+    pos += meta_len
+    blob = buf[pos : pos + blob_len].decode("utf-8")
+    pos += blob_len
+    strings: List[Any] = [None] + blob.split("\0")
+    end = pos + count * RECORD.size
+    if len(buf) < end:
+        raise ValueError("snapshot binario truncado")
+    # extra ya parseados por índice de cadena; los que llevan listas u
+    # objetos se parsean por registro para no compartir valores mutables
+    parsed: Dict[int, Dict[str, Any]] = {}
+    devices: Dict[str, Any] = {}
+    for mac, name, ip, vendor, first_seen, last_seen, notes, extra, flags in RECORD.iter_unpack(buf[pos:end]):
+        dev = {
+            "name": strings[name],
+            "first_seen": strings[first_seen],
+            "allow": bool(flags & FLAG_ALLOW),
+            "block": bool(flags & FLAG_BLOCK),
+            "vendor": strings[vendor],
+            "notes": strings[notes],
+            "ip": strings[ip],
+            "last_seen": strings[last_seen],
+        }
+        if extra:
+            fields = parsed.get(extra)
+            if fields is None:
+                fields = json.loads(strings[extra])
+                if _flat(fields) is not None:
+                    parsed[extra] = fields
+            dev.update(fields)
+        devices[strings[mac]] = dev
+    data["devices"] = devices
+    return data
@@ -0,0 +1,199 @@
+"""Escucha pasiva de ARP y DHCP para detectar dispositivos al instante.
+
+Un hilo lee de un socket ``AF_PACKET`` con un filtro BPF clásico
+(``arp or udp port 67/68``) y entrega cada dispositivo observado a una cola
+de asyncio. No genera tráfico: los barridos activos quedan como pasada de
+reconciliación lenta.
+"""
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .arpsweep import ARP_HEADER, ETH_HEADER, format_mac
+
+logger = logging.getLogger(__name__)
+
+ETH_P_ALL = 0x0003
+SO_ATTACH_FILTER = 26
+SKIP_MACS = {"00:00:00:00:00:00", "FF:FF:FF:FF:FF:FF"}
+DHCP_MAGIC = b"\x63\x82\x53\x63"
+BOOTP_FIXED = 236
+
+# arp or (udp and not fragmento and (src port 67/68 or dst port 67/68))
+BPF_PROGRAM = (
+    (0x28, 0, 0, 12),       # ldh [12]          ethertype
+    (0x15, 12, 0, 0x0806),  # jeq ARP           -> aceptar
+    (0x15, 0, 12, 0x0800),  # jeq IPv4          si no -> descartar
+    (0x30, 0, 0, 23),       # ldb [23]          protocolo IP
+    (0x15, 0, 10, 17),      # jeq UDP           si no -> descartar
+    (0x28, 0, 0, 20),       # ldh [20]          offset de fragmento
+    (0x45, 8, 0, 0x1FFF),   # jset              fragmento -> descartar
+    (0xB1, 0, 0, 14),       # ldxb 4*([14]&0xf) longitud cabecera IP
+    (0x48, 0, 0, 14),       # ldh [x+14]        puerto origen
+    (0x15, 4, 0, 67),
+    (0x15, 3, 0, 68),
+    (0x48, 0, 0, 16),       # ldh [x+16]        puerto destino
+    (0x15, 1, 0, 67),
+    (0x15, 0, 1, 68),
+    (0x06, 0, 0, 0xFFFF),   # ret aceptar
+    (0x06, 0, 0, 0),        # ret descartar
+)
+
+
+def _attach_filter(sock: socket.socket):
+    """Adjunta ``BPF_PROGRAM`` (el kernel copia el programa al adjuntarlo)."""
+    insns = b"".join(struct.pack("HBBI", *insn) for insn in BPF_PROGRAM)
+    buf = ctypes.create_string_buffer(insns)
+    fprog = struct.pack("HL", len(BPF_PROGRAM), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def parse_frame(frame: bytes) -> Optional[Dict[str, Any]]:
+    """Extrae ``{mac, ip, source, ...}`` de una trama ARP o DHCP."""
+    if len(frame) < ETH_HEADER.size:
+        return None
+    ethertype = frame[12:14]
+    if ethertype == b"\x08\x06":
+        return _parse_arp(frame)
+    if ethertype == b"\x08\x00":
+        return _parse_dhcp(frame)
+    return None
+
+
+def _parse_arp(frame: bytes) -> Optional[Dict[str, Any]]:
+    if len(frame) < ETH_HEADER.size + ARP_HEADER.size:
+        return None
+    _, _, _, _, op, sha, spa, _, tpa = ARP_HEADER.unpack_from(frame, ETH_HEADER.size)
+    if op not in (1, 2) or spa == b"\x00\x00\x00\x00":
+        # las sondas ARP (IP origen 0.0.0.0) aún no tienen dirección
+        return None
+    return {
+        "mac": format_mac(sha),
+        "ip": socket.inet_ntoa(spa),
+        "source": "garp" if spa == tpa else "arp",
+    }
+
+
+def _parse_dhcp(frame: bytes) -> Optional[Dict[str, Any]]:
+    ip_start = ETH_HEADER.size
+    if len(frame) < ip_start + 20:
+        return None
+    ihl = (frame[ip_start] & 0x0F) * 4
+    bootp = ip_start + ihl + 8
+    if len(frame) < bootp + BOOTP_FIXED + 4 or frame[bootp + BOOTP_FIXED : bootp + BOOTP_FIXED + 4] != DHCP_MAGIC:
+        return None
+    op = frame[bootp]
+    ciaddr = frame[bootp + 12 : bootp + 16]
+    yiaddr = frame[bootp + 16 : bootp + 20]
+    mac = format_mac(frame[bootp + 28 : bootp + 34])
+    options = _dhcp_options(frame, bootp + BOOTP_FIXED + 4)
+    msg_type = options.get(53, b"\x00")[0]
+    result: Dict[str, Any] = {"mac": mac, "ip": None, "source": "dhcp"}
+    if op == 1:
+        addr = ciaddr if ciaddr != b"\x00" * 4 else options.get(50)
+        if addr and len(addr) == 4:
+            result["ip"] = socket.inet_ntoa(addr)
+        if 12 in options:
+            result["hostname"] = options[12].decode("utf-8", "replace")
+        if 55 in options:
+            result["dhcp_params"] = list(options[55])
+    elif op == 2 and msg_type == 5:  # DHCPACK
+        result["ip"] = socket.inet_ntoa(yiaddr)
+    else:
+        return None
+    return result
+
+
+def _dhcp_options(frame: bytes, pos: int) -> Dict[int, bytes]:
+    options: Dict[int, bytes] = {}
+    end = len(frame)
+    while pos < end:
+        code = frame[pos]
+        if code == 255:
+            break
+        if code == 0:
+            pos += 1
+            continue
+        if pos + 1 >= end:
+            break
+        length = frame[pos + 1]
+        options[code] = frame[pos + 2 : pos + 2 + length]
+        pos += 2 + length
+    return options
+
+
+class PassiveSniffer:
+    """Hilo de captura que publica dispositivos observados en una ``asyncio.Queue``.
+
+    Para no inundar el pipeline, una MAC solo se vuelve a publicar si cambia
+    de IP o han pasado ``repeat_sec`` segundos desde la última vez.
+    """
+
+    def __init__(self, iface: str, repeat_sec: float = 60.0):
+        self.iface = iface
+        self.repeat_sec = repeat_sec
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._recent: Dict[str, Tuple[Optional[str], float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._own_mac: Optional[str] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._run, name=f"sniffer-{self.iface}", daemon=True)
+        self._thread.start()
+        logger.info("Escucha pasiva ARP/DHCP en %s", self.iface)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        try:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        except OSError as exc:
+            logger.error("No se pudo abrir la captura pasiva en %s: %s", self.iface, exc)
+            return
+        with sock:
+            sock.bind((self.iface, ETH_P_ALL))
+            try:
+                _attach_filter(sock)
+            except OSError as exc:
+                logger.warning("Filtro BPF no disponible (%s); se filtra en espacio de usuario", exc)
+            self._own_mac = format_mac(sock.getsockname()[4])
+            sock.settimeout(1.0)
+            while not self._stop.is_set():
+                try:
+                    frame = sock.recv(2048)
+                except socket.timeout:
+                    continue
+                except OSError as exc:
+                    logger.error("Error en la captura pasiva: %s", exc)
+                    time.sleep(1)
+                    continue
+                dev = parse_frame(frame)
+                if dev and self._should_emit(dev):
+                    self._loop.call_soon_threadsafe(self.queue.put_nowait, dev)
+
+    def _should_emit(self, dev: Dict[str, Any]) -> bool:
+        mac = dev["mac"]
+        if mac in SKIP_MACS or mac == self._own_mac or not dev.get("ip"):
+            return False
+        now = time.monotonic()
+        last = self._recent.get(mac)
+        if last and last[0] == dev["ip"] and now - last[1] < self.repeat_sec:
+            return False
+        if len(self._recent) > 10000:
+            self._recent.clear()
+        self._recent[mac] = (dev["ip"], now)
+        return True
@@ -1,94 +1,647 @@
 from __future__ import annotations
-import json, os, threading
-from typing import Dict, Any
-from datetime import datetime, timezone
+import fcntl, ipaddress, json, logging, os, re, threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+
+from . import snapshot
+from .utils import give_to_service, open_shared
+from .classify import CLASSIFY_FIELDS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILES = {"json": "devices.json", "binary": "devices.bin"}
+STATUSES = ("allow", "block", "new")
+# campos opcionales de un avistamiento que se guardan con el dispositivo; ``iface``
+# permite elegir el bloqueador correcto tras reiniciar el servicio
+SIGHTING_EXTRA = ("iface",) + CLASSIFY_FIELDS
+
+
+def device_status(data: Dict[str, Any]) -> str:
+    if data.get("block"):
+        return "block"
+    if data.get("allow"):
+        return "allow"
+    return "new"
+
+
+def open_store(app_cfg: Dict[str, Any], daemon: bool = False):
+    """Crea el backend configurado en ``app.store_backend`` (``json`` o ``sqlite``)."""
+    data_dir = app_cfg.get("data_dir", "/var/lib/raspsentinel")
+    backend = str(app_cfg.get("store_backend", "json")).lower()
+    heartbeat_sec = float(app_cfg.get("last_seen_granularity_sec", 300))
+    if backend == "sqlite":
+        from .store_sqlite import SqliteStore
+
+        return SqliteStore(data_dir, heartbeat_sec=heartbeat_sec)
+    if backend != "json":
+        raise ValueError(f"store_backend desconocido: {backend}")
+    common = dict(
+        heartbeat_sec=heartbeat_sec,
+        journal=bool(app_cfg.get("journal", False)),
+        journal_max_bytes=int(app_cfg.get("journal_max_bytes", 1024 * 1024)),
+        snapshot_format=str(app_cfg.get("store_format", "json")).lower(),
+    )
+    if not daemon:
+        return Store(data_dir, **common)
+    return Store(
+        data_dir,
+        write_behind=bool(app_cfg.get("write_behind", False)),
+        flush_interval=float(app_cfg.get("flush_interval_sec", 5.0)),
+        **common,
+    )
+
+
+MAC_RE = re.compile(r"^[0-9A-F]{2}([:-][0-9A-F]{2}){5}$", re.I)
+
+
+def resolve_term(store, term: str) -> Optional[str]:
+    """Traduce una MAC, IP o nombre amigable a la MAC registrada."""
+    term = term.strip()
+    if MAC_RE.match(term):
+        mac = term.upper().replace("-", ":")
+        return mac if store.get_device(mac) else None
+    try:
+        ipaddress.ip_address(term)
+    except ValueError:
+        return store.find_by_name(term)
+    return store.find_by_ip(term)
+
+
+class DeviceIndex:
+    """Índices secundarios IP→MAC, fabricante→MACs y nombre→MAC.
+
+    ``update`` recuerda las claves indexadas de cada MAC para poder retirar
+    las entradas obsoletas sin recorrer la tabla.
+    """
+
+    def __init__(self, devices: Optional[Dict[str, Any]] = None):
+        self.by_ip: Dict[str, str] = {}
+        self.by_vendor: Dict[str, Set[str]] = {}
+        self.by_name: Dict[str, str] = {}
+        self._keys: Dict[str, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+        for mac, dev in (devices or {}).items():
+            self.update(mac, dev)
+
+    def update(self, mac: str, dev: Optional[Dict[str, Any]]):
+        old = self._keys.pop(mac, (None, None, None))
+        new = (
+            (dev.get("ip"), _fold(dev.get("vendor")), _fold(dev.get("name")))
+            if dev is not None
+            else (None, None, None)
+        )
+        if old == new:
+            if dev is not None:
+                self._keys[mac] = new
+            return
+        ip, vendor, name = old
+        if ip and self.by_ip.get(ip) == mac:
+            del self.by_ip[ip]
+        if vendor and vendor in self.by_vendor:
+            self.by_vendor[vendor].discard(mac)
+            if not self.by_vendor[vendor]:
+                del self.by_vendor[vendor]
+        if name and self.by_name.get(name) == mac:
+            del self.by_name[name]
+        if dev is None:
+            return
+        ip, vendor, name = new
+        if ip:
+            self.by_ip[ip] = mac
+        if vendor:
+            self.by_vendor.setdefault(vendor, set()).add(mac)
+        if name:
+            self.by_name[name] = mac
+        self._keys[mac] = new
+
+
+def _fold(value: Optional[str]) -> Optional[str]:
+    return value.casefold() if value else None
 
 
 class Store:
-    def __init__(self, data_dir: str):
+    """Tabla de dispositivos persistida en ``devices.json``.
+
+    Con ``write_behind=True`` la tabla vive en memoria como fuente de verdad y
+    un hilo en segundo plano vuelca los cambios acumulados cada
+    ``flush_interval`` segundos (y al llamar a ``close``).
+
+    Con ``journal=True`` cada cambio se añade como un registro compacto a
+    ``devices.journal`` en lugar de reescribir el fichero completo; el diario
+    se reproduce al cargar y se compacta en ``devices.json`` cuando supera
+    ``journal_max_bytes``.
+
+    ``heartbeat_sec`` fija cada cuánto se persiste un ``last_seen`` sin otros
+    cambios, para que una red estable apenas genere escrituras.
+
+    Con ``snapshot_format="binary"`` el snapshot se guarda en ``devices.bin``
+    con el formato compacto de :mod:`raspsentinel.snapshot`.
+
+    Los accesos a disco se serializan entre procesos con ``flock`` sobre
+    ``devices.lock`` (compartido para leer, exclusivo para escribir).
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        write_behind: bool = False,
+        flush_interval: float = 5.0,
+        heartbeat_sec: float = 300.0,
+        journal: bool = False,
+        journal_max_bytes: int = 1024 * 1024,
+        snapshot_format: str = "json",
+    ):
+        if snapshot_format not in SNAPSHOT_FILES:
+            raise ValueError(f"store_format desconocido: {snapshot_format}")
         self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
-        self.path = os.path.join(self.data_dir, "devices.json")
-        self._lock = threading.Lock()
-        if not os.path.exists(self.path):
-            self._write({"devices": {}, "block_applied": []})
+        self.snapshot_format = snapshot_format
+        self.path = os.path.join(self.data_dir, SNAPSHOT_FILES[snapshot_format])
+        self.journal_path = os.path.join(self.data_dir, "devices.journal")
+        self.lock_path = os.path.join(self.data_dir, "devices.lock")
+        self.journal = journal
+        self.journal_max_bytes = int(journal_max_bytes)
+        self._lock = threading.RLock()
+        self._cache: Optional[Dict[str, Any]] = None
+        self._pending: Set[str] = set()
+        self._persisted_seen: Dict[str, str] = {}
+        self._index = DeviceIndex()
+        # sin write-behind, ``_index`` se reconstruye solo si cambia esta huella
+        self._index_sig: Optional[Tuple[int, ...]] = None
+        self.heartbeat_sec = max(0.0, float(heartbeat_sec))
+        self._disk_sig: Tuple[int, ...] = ()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.flush_interval = max(0.5, float(flush_interval))
+        with self._file_lock(exclusive=True):
+            if not os.path.exists(self.path):
+                self._create_snapshot()
+            if write_behind:
+                self._cache = self._load(repair=True)
+                self._index = DeviceIndex(self._cache["devices"])
+                self._seed_persisted(self._cache["devices"])
+                self._disk_sig = self._signature()
+        if write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="store-flusher", daemon=True)
+            self._flusher.start()
+
+    @property
+    def write_behind(self) -> bool:
+        return self._cache is not None
+
+    def _seed_persisted(self, devices: Dict[str, Any], macs: Optional[Iterable[str]] = None):
+        """Toma ``last_seen`` de ``devices`` como el valor que hay en disco."""
+        for m in devices if macs is None else macs:
+            seen = devices.get(m, {}).get("last_seen")
+            if seen:
+                self._persisted_seen[m] = seen
+            else:
+                self._persisted_seen.pop(m, None)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Bloqueo ``flock`` entre procesos (y entre hilos, al usar un fd propio)."""
+        # flock no necesita escritura: basta con leer el fichero de bloqueo
+        fd = open_shared(self.lock_path)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def _signature(self) -> Tuple[int, ...]:
+        """Huella del estado en disco para detectar escrituras de otros procesos."""
+        st = os.stat(self.path)
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        return (st.st_ino, st.st_mtime_ns, st.st_size, journal_size)
+
+    def _read_file(self) -> Dict[str, Any]:
+        with self._file_lock(exclusive=False):
+            return self._load()
+
+    def _create_snapshot(self):
+        """Crea el snapshot, convirtiendo el del otro formato si existe."""
+        for fmt, name in SNAPSHOT_FILES.items():
+            other = os.path.join(self.data_dir, name)
+            if fmt == self.snapshot_format or not os.path.exists(other):
+                continue
+            with open(other, "rb") as f:
+                data = self._decode(f.read())
+            self._replay_journal(data["devices"], repair=True)
+            self._write_snapshot(data)
+            os.replace(other, other + ".bak")
+            logger.info("Snapshot %s convertido a formato %s", name, self.snapshot_format)
+            return
+        self._write_snapshot({"devices": {}, "block_applied": []})
+
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        if self.snapshot_format == "binary":
+            return snapshot.encode(data)
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def _decode(buf: bytes) -> Dict[str, Any]:
+        if snapshot.is_binary(buf):
+            return snapshot.decode(buf)
+        return json.loads(buf)
+
+    def _load(self, repair: bool = False) -> Dict[str, Any]:
+        with open(self.path, "rb") as f:
+            data = self._decode(f.read())
+        self._replay_journal(data["devices"], repair)
+        return data
+
+    def _replay_journal(self, devices: Dict[str, Any], repair: bool):
+        if not os.path.exists(self.journal_path):
+            return
+        good = 0
+        torn = False
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("registro incompleto")
+                    rec = json.loads(line)
+                except ValueError:
+                    torn = True
+                    break
+                good += len(line)
+                if rec.get("d") is None:
+                    devices.pop(rec["m"], None)
+                else:
+                    devices[rec["m"]] = rec["d"]
+        if torn and repair:
+            # registro incompleto tras un corte: lo anterior es consistente
+            logger.warning("Diario truncado en el byte %d, se descarta el resto", good)
+            os.truncate(self.journal_path, good)
+
+    def _write_snapshot(self, data: Dict[str, Any]):
+        self._write_payload(self._encode(data))
+
+    def _write_payload(self, payload: bytes):
+        """Escribe el snapshot de forma atómica y vacía el diario que contiene."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            give_to_service(tmp, f.fileno())
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if os.path.exists(self.journal_path):
+            os.truncate(self.journal_path, 0)
+
+    def _append_journal(self, lines: List[str]) -> int:
+        """Añade registros al diario y devuelve su tamaño resultante."""
+        with os.fdopen(open_shared(self.journal_path, os.O_WRONLY | os.O_APPEND), "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+            return os.fstat(f.fileno()).st_size
+
+    @staticmethod
+    def _journal_line(mac: str, dev: Optional[Dict[str, Any]]) -> str:
+        return json.dumps({"m": mac, "d": dev}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def _persist(self, data: Dict[str, Any], changed: Set[str]):
+        if not self.journal:
+            self._write_snapshot(data)
+            return
+        size = self._append_journal([self._journal_line(m, data["devices"].get(m)) for m in changed])
+        if size > self.journal_max_bytes:
+            self._write_snapshot(data)
 
     def _read(self) -> Dict[str, Any]:
+        if self._cache is not None:
+            return self._cache
+        return self._read_file()
+
+    def _mutate(self, fn: Callable[[Dict[str, Any]], Iterable[str]]):
+        """Ejecuta ``fn`` sobre los datos y persiste las MAC que devuelve como modificadas."""
         with self._lock:
-            with open(self.path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            if self._cache is not None:
+                changed = list(fn(self._cache))
+                self._pending.update(changed)
+                devices = self._cache["devices"]
+                for m in changed:
+                    self._index.update(m, devices.get(m))
+                return
+            with self._file_lock(exclusive=True):
+                d = self._load(repair=True)
+                changed = set(fn(d))
+                if changed:
+                    self._persist(d, changed)
 
-    def _write(self, data: Dict[str, Any]):
+    def _merge_external(self, pending: Set[str]):
+        """Incorpora cambios escritos por otro proceso desde el último volcado.
+
+        Las MAC con cambios pendientes en memoria conservan la versión local;
+        el resto toma la de disco. Se sustituye el diccionario completo para no
+        invalidar iteraciones en curso sobre la tabla anterior.
+        """
+        disk = self._load(repair=True)
         with self._lock:
-            tmp = self.path + ".tmp"
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            os.replace(tmp, self.path)
+            devices = disk["devices"]
+            for m in pending:
+                dev = self._cache["devices"].get(m)
+                if dev is None:
+                    devices.pop(m, None)
+                else:
+                    devices[m] = dev
+            self._seed_persisted(disk["devices"], [m for m in disk["devices"] if m not in pending])
+            self._cache = disk
+            self._index = DeviceIndex(devices)
+        logger.info("%s modificado externamente; cambios fusionados en memoria", self.path)
+
+    def flush(self):
+        """Vuelca a disco los cambios pendientes del modo write-behind."""
+        if self._cache is None:
+            return
+        with self._file_lock(exclusive=True):
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            try:
+                if self._signature() != self._disk_sig:
+                    self._merge_external(pending)
+                if not pending:
+                    return
+                with self._lock:
+                    devices = self._cache["devices"]
+                    if self.journal:
+                        lines = [self._journal_line(m, devices.get(m)) for m in pending]
+                    else:
+                        payload = self._encode(self._cache)
+                        # el snapshot completo lleva también los ``last_seen`` aún no persistidos
+                        self._seed_persisted(devices)
+                if not self.journal:
+                    self._write_payload(payload)
+                elif self._append_journal(lines) > self.journal_max_bytes:
+                    with self._lock:
+                        payload = self._encode(self._cache)
+                        self._seed_persisted(self._cache["devices"])
+                    self._write_payload(payload)
+            except Exception:
+                with self._lock:
+                    self._pending |= pending
+                raise
+            finally:
+                self._disk_sig = self._signature()
 
-    def _ensure(self):
-        if not os.path.exists(self.path):
-            self._write({"devices": {}, "block_applied": []})
+    def compact(self):
+        """Reescribe el snapshot con el estado actual y vacía el diario."""
+        if self._cache is not None:
+            self.flush()
+        with self._file_lock(exclusive=True):
+            with self._lock:
+                data = self._cache if self._cache is not None else self._load(repair=True)
+                payload = self._encode(data)
+                if self._cache is not None:
+                    self._seed_persisted(data["devices"])
+            self._write_payload(payload)
+            if self._cache is not None:
+                self._disk_sig = self._signature()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:  # pragma: no cover - se reintenta en el siguiente ciclo
+                logger.error("Error al volcar %s: %s", self.path, exc)
+
+    def close(self):
+        """Detiene el volcado en segundo plano y escribe lo pendiente."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
 
     def upsert_device(self, mac: str, ip: str | None, vendor: str | None):
-        d = self._read()
-        dev = d["devices"].get(mac.upper(), {
-            "name": None,
-            "first_seen": datetime.now(timezone.utc).isoformat(),
-            "allow": False,
-            "block": False,
-            "vendor": vendor,
-            "notes": None,
-        })
+        self.upsert_many([{"mac": mac, "ip": ip, "vendor": vendor}])
+
+    def upsert_many(self, seen: Iterable[Dict[str, Any]]):
+        """Aplica el resultado completo de un escaneo con una única escritura.
+
+        Solo se persisten los cambios semánticos (dispositivo nuevo, cambio de
+        IP, de fabricante o de clasificación); un ``last_seen`` que solo avanza se escribe como
+        mucho una vez cada ``heartbeat_sec``.
+        """
+        now_dt = datetime.now(timezone.utc)
+        now = now_dt.isoformat()
+        due = (now_dt - timedelta(seconds=self.heartbeat_sec)).isoformat()
+
+        def _apply(d: Dict[str, Any]) -> List[str]:
+            changed = []
+            for item in seen:
+                extra = {key: item[key] for key in SIGHTING_EXTRA if item.get(key) is not None}
+                m = self._apply_sighting(
+                    d["devices"], item["mac"], item.get("ip"), item.get("vendor"), now, due, extra
+                )
+                if m:
+                    changed.append(m)
+            return changed
+
+        self._mutate(_apply)
+
+    def touch(self, macs: Iterable[str]):
+        """Latido de dispositivos conocidos que siguen presentes sin cambios.
+
+        Igual que en ``upsert_many``, ``last_seen`` solo se persiste cuando han
+        pasado ``heartbeat_sec`` desde la última escritura.
+        """
+        now_dt = datetime.now(timezone.utc)
+        now = now_dt.isoformat()
+        due = (now_dt - timedelta(seconds=self.heartbeat_sec)).isoformat()
+
+        def _apply(d: Dict[str, Any]) -> List[str]:
+            changed = []
+            for mac in macs:
+                m = mac.upper()
+                dev = d["devices"].get(m)
+                if dev is None:
+                    continue
+                persisted = self._last_persisted(m, dev)
+                dev["last_seen"] = now
+                if persisted and persisted > due:
+                    continue
+                if self._cache is not None:
+                    self._persisted_seen[m] = now
+                changed.append(m)
+            return changed
+
+        self._mutate(_apply)
+
+    def _last_persisted(self, mac: str, dev: Dict[str, Any]) -> Optional[str]:
+        """``last_seen`` que hay en disco para ``mac``.
+
+        En modo write-behind el valor en memoria avanza con cada escaneo, así
+        que se usa el registrado en ``_persisted_seen`` (sembrado al cargar).
+        """
+        if self._cache is not None:
+            return self._persisted_seen.get(mac)
+        return dev.get("last_seen")
+
+    def _apply_sighting(
+        self,
+        devices: Dict[str, Any],
+        mac: str,
+        ip: str | None,
+        vendor: str | None,
+        now: str,
+        due: str,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Optional[str]:
+        """Actualiza un dispositivo y devuelve su MAC si hay algo que persistir."""
+        m = mac.upper()
+        dev = devices.get(m)
+        if dev is None:
+            dev = devices[m] = {
+                "name": None,
+                "first_seen": now,
+                "allow": False,
+                "block": False,
+                "vendor": vendor,
+                "notes": None,
+            }
+            semantic = True
+        else:
+            semantic = dev.get("ip") != ip or bool(vendor and vendor != dev.get("vendor"))
+        if extra and any(dev.get(key) != value for key, value in extra.items()):
+            dev.update(extra)
+            semantic = True
+        persisted = self._last_persisted(m, dev)
         dev["ip"] = ip
         dev["vendor"] = vendor or dev.get("vendor")
-        dev["last_seen"] = datetime.now(timezone.utc).isoformat()
-        d["devices"][mac.upper()] = dev
-        self._write(d)
+        dev["last_seen"] = now
+        if not semantic and persisted and persisted > due:
+            return None
+        if self._cache is not None:
+            self._persisted_seen[m] = now
+        return m
 
     def mark_allow(self, mac: str, name: str | None = None):
-        d = self._read()
         m = mac.upper()
-        if m not in d["devices"]:
-            d["devices"][m] = {"name": name, "allow": True, "block": False}
-        else:
-            d["devices"][m]["allow"] = True
-            d["devices"][m]["block"] = False
-            if name:
-                d["devices"][m]["name"] = name
-        self._write(d)
+
+        def _apply(d: Dict[str, Any]) -> List[str]:
+            if m not in d["devices"]:
+                d["devices"][m] = {"name": name, "allow": True, "block": False}
+            else:
+                d["devices"][m]["allow"] = True
+                d["devices"][m]["block"] = False
+                if name:
+                    d["devices"][m]["name"] = name
+            return [m]
+
+        self._mutate(_apply)
 
     def mark_block(self, mac: str, reason: str | None = None):
-        d = self._read()
         m = mac.upper()
-        if m not in d["devices"]:
-            d["devices"][m] = {"name": None, "allow": False, "block": True}
-        else:
-            d["devices"][m]["block"] = True
-            d["devices"][m]["allow"] = False
-        if reason:
-            d["devices"][m]["notes"] = reason
-        self._write(d)
+
+        def _apply(d: Dict[str, Any]) -> List[str]:
+            if m not in d["devices"]:
+                d["devices"][m] = {"name": None, "allow": False, "block": True}
+            else:
+                d["devices"][m]["block"] = True
+                d["devices"][m]["allow"] = False
+            if reason:
+                d["devices"][m]["notes"] = reason
+            return [m]
+
+        self._mutate(_apply)
 
     def unallow(self, mac: str):
-        d = self._read()
-        m = mac.upper()
-        if m in d["devices"]:
-            d["devices"][m]["allow"] = False
-            self._write(d)
+        self._set_field(mac, "allow", False)
 
     def unblock(self, mac: str):
-        d = self._read()
-        m = mac.upper()
-        if m in d["devices"]:
-            d["devices"][m]["block"] = False
-            self._write(d)
+        self._set_field(mac, "block", False)
 
     def set_name(self, mac: str, name: str):
-        d = self._read()
+        self._set_field(mac, "name", name)
+
+    def _set_field(self, mac: str, key: str, value: Any):
         m = mac.upper()
-        if m in d["devices"]:
-            d["devices"][m]["name"] = name
-            self._write(d)
+
+        def _apply(d: Dict[str, Any]) -> List[str]:
+            if m not in d["devices"]:
+                return []
+            d["devices"][m][key] = value
+            return [m]
+
+        self._mutate(_apply)
+
+    def delete_devices(self, macs: Iterable[str]):
+        """Elimina dispositivos del historial (usado por la retención)."""
+        targets = [m.upper() for m in macs]
+
+        def _apply(d: Dict[str, Any]) -> List[str]:
+            removed = [m for m in targets if d["devices"].pop(m, None) is not None]
+            for m in removed:
+                self._persisted_seen.pop(m, None)
+            return removed
+
+        self._mutate(_apply)
+
+    def get_device(self, mac: str) -> Optional[Dict[str, Any]]:
+        return self._read()["devices"].get(mac.upper())
+
+    def get_devices(self, macs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Varios dispositivos con una sola lectura; las MAC desconocidas no aparecen."""
+        devices = self._read()["devices"]
+        return {m: devices[m] for m in (mac.upper() for mac in macs) if m in devices}
+
+    def _current_index(self) -> "DeviceIndex":
+        if self._cache is not None:
+            return self._index
+        with self._lock, self._file_lock(exclusive=False):
+            sig = self._signature()
+            if sig != self._index_sig:
+                self._index = DeviceIndex(self._load()["devices"])
+                self._index_sig = sig
+            return self._index
+
+    def find_by_ip(self, ip: str) -> Optional[str]:
+        return self._current_index().by_ip.get(ip)
+
+    def find_by_name(self, name: str) -> Optional[str]:
+        return self._current_index().by_name.get(name.casefold())
+
+    def macs_by_vendor(self, vendor: str) -> List[str]:
+        return sorted(self._current_index().by_vendor.get(vendor.casefold(), ()))
+
+    def resolve(self, term: str) -> Optional[str]:
+        return resolve_term(self, term)
 
     def list_devices(self) -> Dict[str, Any]:
+        """Devuelve la tabla de dispositivos (en modo write-behind, la tabla viva: no modificar)."""
         return self._read()["devices"]
+
+    def devices_with_status(self, status: str) -> Dict[str, Any]:
+        """Dispositivos con estado ``allow``, ``block`` o ``new``, ordenados por MAC."""
+        status = status.lower()
+        devices = self._read()["devices"]
+        return {m: d for m, d in sorted(devices.items()) if device_status(d) == status}
+
+    def count_devices(self) -> int:
+        return len(self._read()["devices"])
+
+    def recent_devices(self, limit: Optional[int] = None, offset: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        """Dispositivos ordenados por ``last_seen`` descendente."""
+        devices = self._read()["devices"]
+        ordered = sorted(devices.items(), key=lambda item: item[1].get("last_seen") or "", reverse=True)
+        end = None if limit is None else offset + limit
+        return ordered[offset:end]
+
+
+def convert_snapshot(data_dir: str, to_format: str) -> int:
+    """Convierte el snapshot al formato indicado y devuelve el número de dispositivos.
+
+    Incorpora el diario pendiente y deja el fichero anterior como ``.bak``.
+    """
+    if to_format not in SNAPSHOT_FILES:
+        raise ValueError(f"store_format desconocido: {to_format}")
+    target = os.path.join(data_dir, SNAPSHOT_FILES[to_format])
+    sources = [os.path.join(data_dir, name) for fmt, name in SNAPSHOT_FILES.items() if fmt != to_format]
+    if os.path.exists(target) and any(os.path.exists(path) for path in sources):
+        os.replace(target, target + ".bak")
+    store = Store(data_dir, snapshot_format=to_format)
+    store.compact()
+    return store.count_devices()
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .store import SIGHTING_EXTRA, SNAPSHOT_FILES, Store, resolve_term
+from .utils import open_shared
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("name", "ip", "vendor", "first_seen", "last_seen", "allow", "block", "notes")
+BOOL_COLUMNS = ("allow", "block")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    mac TEXT PRIMARY KEY,
+    name TEXT,
+    ip TEXT,
+    vendor TEXT,
+    first_seen TEXT,
+    last_seen TEXT,
+    allow INTEGER NOT NULL DEFAULT 0,
+    block INTEGER NOT NULL DEFAULT 0,
+    notes TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS devices_status ON devices (block, allow);
+CREATE INDEX IF NOT EXISTS devices_last_seen ON devices (last_seen);
+CREATE INDEX IF NOT EXISTS devices_ip ON devices (ip);
+CREATE INDEX IF NOT EXISTS devices_vendor ON devices (vendor COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+STATUS_WHERE = {
+    "block": "block = 1",
+    "allow": "allow = 1 AND block = 0",
+    "new": "allow = 0 AND block = 0",
+}
+
+
+class SqliteStore:
+    """Backend SQLite (modo WAL) con la misma interfaz que ``Store``."""
+
+    def __init__(self, data_dir: str, heartbeat_sec: float = 300.0):
+        self.data_dir = data_dir
+        self.heartbeat_sec = max(0.0, float(heartbeat_sec))
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.path = os.path.join(self.data_dir, "devices.db")
+        # la CLI (root) y el servicio comparten la base: si la crea root pasa al
+        # usuario del servicio, y SQLite da a -wal/-shm el dueño y modo de devices.db
+        for path in (self.path, self.path + "-wal", self.path + "-shm"):
+            if path == self.path or os.path.exists(path):
+                os.close(open_shared(path))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._migrate_json()
+
+    def _migrate_json(self):
+        """Importa un ``devices.json`` previo la primera vez que se abre la base."""
+        fmt = "binary" if os.path.exists(os.path.join(self.data_dir, SNAPSHOT_FILES["binary"])) else "json"
+        json_path = os.path.join(self.data_dir, SNAPSHOT_FILES[fmt])
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done or not os.path.exists(json_path):
+                return
+            try:
+                devices = Store(self.data_dir, snapshot_format=fmt).list_devices()
+            except (OSError, ValueError, KeyError) as exc:
+                logger.error("No se pudo importar %s: %s", json_path, exc)
+                return
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO devices (mac, name, ip, vendor, first_seen, last_seen, allow, block, notes, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._to_row(mac, info) for mac, info in devices.items()],
+                )
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('migrated_json', ?)",
+                    (datetime.now(timezone.utc).isoformat(),),
+                )
+            logger.info("Importados %d dispositivos desde %s", len(devices), json_path)
+
+    @staticmethod
+    def _to_row(mac: str, info: Dict[str, Any]) -> Tuple[Any, ...]:
+        extra = {k: v for k, v in info.items() if k not in COLUMNS}
+        return (
+            mac.upper(),
+            info.get("name"),
+            info.get("ip"),
+            info.get("vendor"),
+            info.get("first_seen"),
+            info.get("last_seen"),
+            int(bool(info.get("allow"))),
+            int(bool(info.get("block"))),
+            info.get("notes"),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        data: Dict[str, Any] = {key: row[key] for key in COLUMNS}
+        for key in BOOL_COLUMNS:
+            data[key] = bool(data[key])
+        if row["extra"]:
+            data.update(json.loads(row["extra"]))
+        return data
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def _execute(self, sql: str, params: Iterable[Any] = ()):
+        with self._lock:
+            self._conn.execute(sql, tuple(params))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def upsert_device(self, mac: str, ip: str | None, vendor: str | None):
+        self.upsert_many([{"mac": mac, "ip": ip, "vendor": vendor}])
+
+    def upsert_many(self, seen: Iterable[Dict[str, Any]]):
+        """Aplica el resultado completo de un escaneo en una única transacción.
+
+        Las filas sin cambios de IP o fabricante solo se actualizan cuando su
+        ``last_seen`` tiene más de ``heartbeat_sec`` segundos.
+        """
+        now_dt = datetime.now(timezone.utc)
+        now = now_dt.isoformat()
+        due = (now_dt - timedelta(seconds=self.heartbeat_sec)).isoformat()
+        seen = list(seen)
+        rows = [(item["mac"].upper(), item.get("ip"), item.get("vendor"), now, now, due) for item in seen]
+        # la clasificación va a la columna ``extra``; solo la llevan altas y cambios
+        tagged = []
+        for item in seen:
+            extra = {key: item[key] for key in SIGHTING_EXTRA if item.get(key) is not None}
+            if extra:
+                tagged.append((json.dumps(extra, ensure_ascii=False), item["mac"].upper()))
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO devices (mac, ip, vendor, first_seen, last_seen) VALUES (?1, ?2, ?3, ?4, ?5) "
+                "ON CONFLICT(mac) DO UPDATE SET ip = excluded.ip, "
+                "vendor = COALESCE(excluded.vendor, devices.vendor), last_seen = excluded.last_seen "
+                "WHERE devices.ip IS NOT excluded.ip "
+                "OR (excluded.vendor IS NOT NULL AND devices.vendor IS NOT excluded.vendor) "
+                "OR devices.last_seen IS NULL OR devices.last_seen <= ?6",
+                rows,
+            )
+            if tagged:
+                self._conn.executemany(
+                    "UPDATE devices SET extra = json_patch(COALESCE(extra, '{}'), ?1) "
+                    "WHERE mac = ?2 AND extra IS NOT json_patch(COALESCE(extra, '{}'), ?1)",
+                    tagged,
+                )
+
+    def touch(self, macs: Iterable[str]):
+        """Latido de dispositivos conocidos: ``last_seen`` como mucho cada ``heartbeat_sec``."""
+        now_dt = datetime.now(timezone.utc)
+        now = now_dt.isoformat()
+        due = (now_dt - timedelta(seconds=self.heartbeat_sec)).isoformat()
+        rows = [(now, mac.upper(), due) for mac in macs]
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE devices SET last_seen = ? WHERE mac = ? AND (last_seen IS NULL OR last_seen <= ?)", rows
+            )
+
+    def mark_allow(self, mac: str, name: str | None = None):
+        self._execute(
+            "INSERT INTO devices (mac, name, allow, block) VALUES (?, ?, 1, 0) "
+            "ON CONFLICT(mac) DO UPDATE SET allow = 1, block = 0, name = COALESCE(excluded.name, devices.name)",
+            (mac.upper(), name or None),
+        )
+
+    def mark_block(self, mac: str, reason: str | None = None):
+        self._execute(
+            "INSERT INTO devices (mac, notes, allow, block) VALUES (?, ?, 0, 1) "
+            "ON CONFLICT(mac) DO UPDATE SET allow = 0, block = 1, notes = COALESCE(excluded.notes, devices.notes)",
+            (mac.upper(), reason or None),
+        )
+
+    def unallow(self, mac: str):
+        self._execute("UPDATE devices SET allow = 0 WHERE mac = ?", (mac.upper(),))
+
+    def unblock(self, mac: str):
+        self._execute("UPDATE devices SET block = 0 WHERE mac = ?", (mac.upper(),))
+
+    def set_name(self, mac: str, name: str):
+        self._execute("UPDATE devices SET name = ? WHERE mac = ?", (name, mac.upper()))
+
+    def delete_devices(self, macs: Iterable[str]):
+        """Elimina dispositivos del historial (usado por la retención)."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM devices WHERE mac = ?", [(m.upper(),) for m in macs])
+
+    def get_device(self, mac: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM devices WHERE mac = ?", (mac.upper(),))
+        return self._from_row(rows[0]) if rows else None
+
+    def get_devices(self, macs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Varios dispositivos en pocas consultas; las MAC desconocidas no aparecen."""
+        wanted = sorted({mac.upper() for mac in macs})
+        found: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            for row in self._query(f"SELECT * FROM devices WHERE mac IN ({marks})", chunk):
+                found[row["mac"]] = self._from_row(row)
+        return found
+
+    def find_by_ip(self, ip: str) -> Optional[str]:
+        rows = self._query("SELECT mac FROM devices WHERE ip = ? ORDER BY last_seen DESC LIMIT 1", (ip,))
+        return rows[0]["mac"] if rows else None
+
+    def find_by_name(self, name: str) -> Optional[str]:
+        rows = self._query("SELECT mac FROM devices WHERE name = ? COLLATE NOCASE LIMIT 1", (name,))
+        return rows[0]["mac"] if rows else None
+
+    def macs_by_vendor(self, vendor: str) -> List[str]:
+        rows = self._query("SELECT mac FROM devices WHERE vendor = ? COLLATE NOCASE ORDER BY mac", (vendor,))
+        return [row["mac"] for row in rows]
+
+    def resolve(self, term: str) -> Optional[str]:
+        return resolve_term(self, term)
+
+    def list_devices(self) -> Dict[str, Any]:
+        return {row["mac"]: self._from_row(row) for row in self._query("SELECT * FROM devices")}
+
+    def devices_with_status(self, status: str) -> Dict[str, Any]:
+        """Dispositivos con estado ``allow``, ``block`` o ``new``, ordenados por MAC."""
+        where = STATUS_WHERE[status.lower()]
+        rows = self._query(f"SELECT * FROM devices WHERE {where} ORDER BY mac")
+        return {row["mac"]: self._from_row(row) for row in rows}
+
+    def count_devices(self) -> int:
+        return self._query("SELECT COUNT(*) FROM devices")[0][0]
+
+    def recent_devices(self, limit: Optional[int] = None, offset: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        """Dispositivos ordenados por ``last_seen`` descendente."""
+        rows = self._query(
+            "SELECT * FROM devices ORDER BY last_seen DESC LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset),
+        )
+        return [(row["mac"], self._from_row(row)) for row in rows]
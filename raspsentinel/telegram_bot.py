@@ -18,10 +18,11 @@ from telegram.ext import (
 class TelegramBot:
     PAGE_SIZE = 5
 
-    def __init__(self, token: str, chat_id: int, store, block_apply_cb, block_remove_cb):
+    def __init__(self, token: str, chat_id: int, store, block_apply_cb, block_remove_cb, presence=None):
         self.token = token
         self.chat_id = int(chat_id)
         self.store = store
+        self.presence = presence
         self.block_apply_cb = block_apply_cb
         self.block_remove_cb = block_remove_cb
         self.app = Application.builder().token(self.token).build()
@@ -137,11 +138,12 @@ class TelegramBot:
         if not await self._authorized(update):
             return await self._reject(update)
         if not ctx.args:
-            return await update.message.reply_text("Uso: /device <MAC>")
-        mac = ctx.args[0].upper()
-        device = self.store.list_devices().get(mac)
+            return await update.message.reply_text("Uso: /device <MAC|IP|nombre>")
+        term = " ".join(ctx.args)
+        mac = self.store.resolve(term)
+        device = self.store.get_device(mac) if mac else None
         if not device:
-            return await update.message.reply_text(f"No hay información para {mac}")
+            return await update.message.reply_text(f"No hay información para {term}")
         text = self._format_device_card(mac, device)
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
@@ -183,7 +185,7 @@ class TelegramBot:
     async def notify_new(self, device: Dict[str, Any]):
         mac = device.get("mac")
         ip = device.get("ip")
-        vendor = device.get("vendor") or "?"
+        vendor = device.get("vendor") or ("MAC aleatoria" if device.get("randomized") else "?")
         kb = InlineKeyboardMarkup(
             [
                 [
@@ -196,6 +198,8 @@ class TelegramBot:
         text = (
             f"\nNuevo dispositivo visto:\nMAC: *{mac}*\nIP: `{ip}`\nVendor: _{vendor}_"
         )
+        if device.get("alias_of"):
+            text += f"\nMisma huella DHCP que *{device['alias_of']}*"
         await self.app.bot.send_message(
             chat_id=self.chat_id,
             text=text,
@@ -204,10 +208,7 @@ class TelegramBot:
         )
 
     def _render_allowlist(self) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
-        devs = self.store.list_devices()
-        allow = [
-            (m, d) for m, d in sorted(devs.items()) if d.get("allow")
-        ]
+        allow = list(self.store.devices_with_status("allow").items())
         if not allow:
             return ("Allowlist vacía.", None)
         lines = [
@@ -217,10 +218,7 @@ class TelegramBot:
         return ("Allowlist:\n" + "\n".join(lines), None)
 
     def _render_blocklist(self) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
-        devs = self.store.list_devices()
-        blocked = [
-            (m, d) for m, d in sorted(devs.items()) if d.get("block")
-        ]
+        blocked = list(self.store.devices_with_status("block").items())
         if not blocked:
             return ("Blocklist vacía.", None)
         lines = []
@@ -259,6 +257,11 @@ class TelegramBot:
         ]
         if notes := data.get("notes"):
             lines.append(f"Notas: {notes}")
+        if self.presence is not None:
+            history = self.presence.summary(mac)
+            if history:
+                lines.append("Presencia:")
+                lines.extend(f"  {line}" for line in history)
         return "\n".join(lines)
 
     def _handle_connected_callback(
@@ -285,19 +288,19 @@ class TelegramBot:
     def _render_connected_page(
         self, page: int
     ) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
-        devices = self.store.list_devices()
-        entries = self._prepare_connected_entries(devices)
-        total = len(entries)
+        total = self.store.count_devices()
         total_pages = max(1, math.ceil(total / self.PAGE_SIZE))
         page = max(0, min(page, total_pages - 1))
         start = page * self.PAGE_SIZE
-        end = start + self.PAGE_SIZE
+        entries = self._prepare_connected_entries(
+            self.store.recent_devices(limit=self.PAGE_SIZE, offset=start)
+        )
 
         if total == 0:
             text = "Sin datos recientes. Usa /connected más tarde para refrescar."
         else:
             lines = []
-            for idx, entry in enumerate(entries[start:end], start=1 + start):
+            for idx, entry in enumerate(entries, start=1 + start):
                 line = (
                     f"{idx}. {entry['mac']} [{entry['status']}] "
                     f"IP {entry['ip']} | {entry['name']} | {entry['vendor']} | {entry['last_seen']}"
@@ -338,33 +341,29 @@ class TelegramBot:
         return text, markup
 
     def _prepare_connected_entries(
-        self, devices: Dict[str, Any]
+        self, devices: List[Tuple[str, Dict[str, Any]]]
     ) -> List[Dict[str, str]]:
+        """Formatea una página ya ordenada por ``last_seen`` desde el store."""
         now = datetime.now(timezone.utc)
-        entries: List[Tuple[datetime, Dict[str, str]]] = []
-        for mac, data in devices.items():
+        entries: List[Dict[str, str]] = []
+        for mac, data in devices:
             last_ts = data.get("last_seen") or data.get("first_seen")
             last_dt = (
                 self._parse_iso(last_ts)
                 if last_ts
                 else datetime.fromtimestamp(0, tz=timezone.utc)
             )
-            status = self._status_for_device(data)
             entries.append(
-                (
-                    last_dt or datetime.fromtimestamp(0, tz=timezone.utc),
-                    {
-                        "mac": mac,
-                        "ip": data.get("ip") or "?",
-                        "name": data.get("name") or "—",
-                        "vendor": data.get("vendor") or "?",
-                        "status": status,
-                        "last_seen": self._format_last_seen(last_dt, now),
-                    },
-                )
+                {
+                    "mac": mac,
+                    "ip": data.get("ip") or "?",
+                    "name": data.get("name") or "—",
+                    "vendor": data.get("vendor") or "?",
+                    "status": self._status_for_device(data),
+                    "last_seen": self._format_last_seen(last_dt, now),
+                }
             )
-        sorted_entries = sorted(entries, key=lambda item: item[0], reverse=True)
-        return [entry for _, entry in sorted_entries]
+        return entries
 
     @staticmethod
     def _status_for_device(data: Dict[str, Any]) -> str:
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+import os
 import shutil
 import subprocess
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Optional
 
 
 class ShellError(RuntimeError):
@@ -18,3 +23,74 @@ def run(cmd: list[str], timeout: int = 15) -> str:
 
 def has_cmd(name: str) -> bool:
     return shutil.which(name) is not None
+
+
+def give_to_service(path: str, fd: Optional[int] = None) -> None:
+    """Si corre como root, pasa ``path`` al propietario de su directorio.
+
+    La CLI se ejecuta con ``sudo`` y el servicio como ``raspsentinel``, dueño
+    del directorio de datos: así lo que cree la CLI sigue siendo del servicio.
+    """
+    if os.geteuid() != 0:
+        return
+    parent = os.stat(os.path.dirname(os.path.abspath(path)))
+    st = os.fstat(fd) if fd is not None else os.stat(path)
+    if (st.st_uid, st.st_gid) == (parent.st_uid, parent.st_gid):
+        return
+    if fd is not None:
+        os.fchown(fd, parent.st_uid, parent.st_gid)
+    else:
+        os.chown(path, parent.st_uid, parent.st_gid)
+
+
+def open_shared(path: str, flags: int = os.O_RDONLY) -> int:
+    """Abre (creándolo si falta, modo 0660) un fichero de datos compartido con la CLI.
+
+    Ver ``give_to_service``: un fichero creado por root, también uno antiguo,
+    pasa al usuario del servicio.
+    """
+    fd = os.open(path, flags | os.O_CREAT, 0o660)
+    try:
+        give_to_service(path, fd)
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+@asynccontextmanager
+async def aclosing(agen: AsyncGenerator) -> AsyncIterator[AsyncGenerator]:
+    """Equivalente a ``contextlib.aclosing`` (Python 3.10+) para Python 3.9."""
+    try:
+        yield agen
+    finally:
+        await agen.aclose()
+
+
+async def stream_lines(cmd: list[str], timeout: float = 15) -> AsyncIterator[str]:
+    """Genera las líneas de salida de ``cmd`` según las escribe el proceso.
+
+    ``timeout`` limita la ejecución completa; al vencer, al cancelar o al
+    cerrar el generador antes de tiempo el proceso se mata.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tail: deque[str] = deque(maxlen=5)
+    try:
+        while True:
+            raw = await asyncio.wait_for(proc.stdout.readline(), max(0.0, deadline - loop.time()))
+            if not raw:
+                break
+            line = raw.decode(errors="replace")
+            tail.append(line)
+            yield line
+        await asyncio.wait_for(proc.wait(), max(0.0, deadline - loop.time()))
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode:
+        raise ShellError(f"cmd failed: {' '.join(cmd)}\n{''.join(tail)}")
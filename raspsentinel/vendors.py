@@ -2,8 +2,13 @@ from __future__ import annotations
 
 import os
 import logging
-from functools import lru_cache
-from typing import Dict, Optional
+import threading
+import urllib.request
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .ouidb import OuiDatabase, Range, RangeTable, compile_db, flatten, iter_registry
+from .utils import give_to_service
 
 try:
     from mac_vendor_lookup import MacLookup  # type: ignore
@@ -12,49 +17,218 @@ except ImportError:  # pragma: no cover - optional dependency at runtime
 
 logger = logging.getLogger(__name__)
 
-IEEE_OUI_PATHS = (
+# del prefijo más corto al más largo: si un prefijo se repite gana el último fichero
+IEEE_REGISTRY_PATHS = (
     "/usr/share/arp-scan/ieee-oui.txt",
     "/usr/share/misc/ieee-oui.txt",
-)
-IEEE_IAB_PATHS = (
+    "/usr/share/ieee-data/oui.txt",
+    "/usr/share/ieee-data/mam.txt",
     "/usr/share/arp-scan/ieee-iab.txt",
     "/usr/share/misc/ieee-iab.txt",
+    "/usr/share/ieee-data/iab.txt",
+    "/usr/share/ieee-data/oui36.txt",
 )
+# registros descargados con ``vendors update`` (en data_dir/ieee)
+IEEE_URLS = {
+    "oui.txt": "https://standards-oui.ieee.org/oui/oui.txt",
+    "mam.txt": "https://standards-oui.ieee.org/oui28/mam.txt",
+    "oui36.txt": "https://standards-oui.ieee.org/oui36/oui36.txt",
+}
+IEEE_CACHE_DIR = "ieee"
+VENDOR_DB_NAME = "vendors.bin"
+DEFAULT_DATA_DIR = "/var/lib/raspsentinel"
+
+
+def registry_sources(data_dir: str) -> List[str]:
+    """Ficheros de registro disponibles: los del sistema y luego los descargados."""
+    cached = [os.path.join(data_dir, IEEE_CACHE_DIR, name) for name in IEEE_URLS]
+    return [path for path in list(IEEE_REGISTRY_PATHS) + cached if os.path.exists(path)]
+
+
+def download_registries(data_dir: str, timeout: float = 60.0) -> List[str]:
+    """Descarga los registros del IEEE a ``data_dir/ieee`` y devuelve los actualizados.
+
+    Cada fichero se escribe aparte y se renombra al terminar; si una descarga
+    falla se conserva la copia anterior. Con ``sudo`` el directorio y los
+    ficheros pasan al usuario del servicio, que los refresca después.
+    """
+    target_dir = os.path.join(data_dir, IEEE_CACHE_DIR)
+    os.makedirs(target_dir, exist_ok=True)
+    give_to_service(target_dir)
+    updated = []
+    for name, url in IEEE_URLS.items():
+        path = os.path.join(target_dir, name)
+        tmp = path + ".tmp"
+        try:
+            request = urllib.request.Request(url, headers={"User-Agent": "raspsentinel"})
+            with urllib.request.urlopen(request, timeout=timeout) as resp, open(tmp, "wb") as fh:
+                while True:
+                    chunk = resp.read(65536)
+                    if not chunk:
+                        break
+                    fh.write(chunk)
+                give_to_service(tmp, fh.fileno())
+            os.replace(tmp, path)
+            updated.append(path)
+        except OSError as exc:
+            logger.warning("No se pudo descargar %s: %s", url, exc)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return updated
+
+
+def refresh_database(data_dir: str, download: bool = True) -> int:
+    """Descarga (opcional) los registros y recompila ``data_dir/vendors.bin``."""
+    if download:
+        download_registries(data_dir)
+    sources = registry_sources(data_dir)
+    if not sources:
+        return 0
+    return compile_db(sources, os.path.join(data_dir, VENDOR_DB_NAME))
+
+
+# marca en la caché de un OUI subdividido (su fabricante depende de los 36 bits)
+SUBDIVIDED: Any = object()
+
+
+class PrefixCache:
+    """LRU acotada de fabricantes por prefijo.
+
+    ``VendorLookup`` usa el OUI (6 dígitos hex) como clave, así que todas las
+    MAC de un bloque MA-L comparten entrada; solo los OUI subdivididos en
+    MA-M/MA-S usan claves de 9 dígitos. Cuenta aciertos, fallos y
+    expulsiones para el servicio.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = max(1, int(maxsize))
+        self._data: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key: str, value: Optional[str]) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
 
 
 class VendorLookup:
-    """Resuelve fabricantes a partir de los ficheros OUI/IAB instalados por arp-scan."""
+    """Resuelve fabricantes a partir de los registros IEEE (MA-L, MA-M y MA-S).
+
+    Si existe la tabla compilada ``data_dir/vendors.bin`` (``raspsentinel
+    vendors compile|update``) se consulta mapeada en memoria en lugar de
+    parsear los ficheros de texto. Nunca se accede a la red: las descargas
+    solo ocurren en ``refresh_database``, fuera del camino de búsqueda.
+    """
 
-    def __init__(self) -> None:
-        self._map6: Dict[str, str] = {}
-        self._map9: Dict[str, str] = {}
+    def __init__(self, data_dir: str = DEFAULT_DATA_DIR, cache_size: int = 4096) -> None:
+        self.data_dir = data_dir
+        self.cache = PrefixCache(cache_size)
+        self._table: Optional[Union[OuiDatabase, RangeTable]] = None
         self._loaded = False
+        self._load_lock = threading.Lock()
         self._mac_lookup: Optional["MacLookup"] = None
         self._mac_lookup_failed = False
 
-    def _load(self) -> None:
+    @property
+    def db_path(self) -> str:
+        return os.path.join(self.data_dir, VENDOR_DB_NAME)
+
+    def configure(self, data_dir: str, cache_size: Optional[int] = None) -> None:
+        """Cambia el directorio de datos; las tablas se recargan en la siguiente carga.
+
+        Pensado para el arranque, antes de ``load``. Para cambiar la tabla con
+        el servicio en marcha se usa ``reload``.
+        """
+        if cache_size is not None and cache_size != self.cache.maxsize:
+            self.cache = PrefixCache(cache_size)
+        with self._load_lock:
+            self.data_dir = data_dir
+            self._loaded = False
+        self.cache.clear()
+
+    def reload(self) -> None:
+        """Abre la tabla recompilada y la sustituye de una vez.
+
+        Las búsquedas en curso siguen usando la tabla anterior, que no se
+        cierra: su mmap se libera cuando deja de tener referencias.
+        """
+        with self._load_lock:
+            table = self._open_table()
+            self._table = table
+            self._loaded = True
+        self.cache.clear()
+
+    def load(self) -> None:
+        """Carga las tablas. El servicio lo llama en un hilo al arrancar."""
+        with self._load_lock:
+            self._load_locked()
+
+    def _load_locked(self) -> None:
         if self._loaded:
             return
-        for path in IEEE_OUI_PATHS:
-            self._parse_file(path, self._map6)
-        for path in IEEE_IAB_PATHS:
-            self._parse_file(path, self._map9)
+        self._table = self._open_table()
+        self._ensure_mac_lookup()
         self._loaded = True
+        self.cache.clear()
 
-    def _parse_file(self, path: str, target: Dict[str, str]) -> None:
-        if not os.path.exists(path):
-            return
+    def _open_table(self) -> Union[OuiDatabase, RangeTable]:
+        if os.path.exists(self.db_path):
+            try:
+                return OuiDatabase(self.db_path)
+            except (OSError, ValueError) as exc:
+                logger.warning("No se pudo abrir %s, se usan los ficheros de texto: %s", self.db_path, exc)
+        entries: List[Range] = []
+        for path in registry_sources(self.data_dir):
+            try:
+                entries.extend(iter_registry(path))
+            except OSError:
+                continue
+        return RangeTable(flatten(entries))
+
+    def _ensure_loaded(self) -> bool:
+        """Carga las tablas si nadie lo está haciendo; nunca espera a otra carga."""
+        if self._loaded:
+            return True
+        if not self._load_lock.acquire(blocking=False):
+            return False
         try:
-            with open(path, "r", encoding="utf-8", errors="ignore") as fh:
-                for line in fh:
-                    if "(base 16)" in line or "(base 36)" in line:
-                        prefix, _, vendor = line.partition("(base")
-                        prefix = prefix.strip().replace("-", "").replace(":", "").upper()
-                        vendor = vendor.split(")", 1)[-1].strip()
-                        if prefix and vendor:
-                            target[prefix] = vendor
-        except OSError:
-            return
+            self._load_locked()
+        finally:
+            self._load_lock.release()
+        return True
 
     def _ensure_mac_lookup(self) -> Optional["MacLookup"]:
         if self._mac_lookup_failed:
@@ -66,12 +240,12 @@ class VendorLookup:
             return None
         try:
             lookup = MacLookup()
-            try:
-                lookup.load_vendors()
-            except FileNotFoundError:
-                lookup.update_vendors()
-                lookup.load_vendors()
+            # solo la caché local de mac_vendor_lookup; nunca ``update_vendors()`` aquí
+            lookup.load_vendors()
             self._mac_lookup = lookup
+        except FileNotFoundError:
+            logger.debug("mac_vendor_lookup sin caché local; se usan las tablas IEEE")
+            self._mac_lookup_failed = True
         except Exception as exc:  # pragma: no cover - defensive fallback
             logger.debug("Mac vendor lookup unavailable: %s", exc)
             self._mac_lookup_failed = True
@@ -89,20 +263,33 @@ class VendorLookup:
         except Exception:  # pragma: no cover - fall back to local tables
             return None
 
-    @lru_cache(maxsize=256)
     def lookup(self, mac: str) -> Optional[str]:
-        self._load()
         clean = mac.upper().replace(":", "").replace("-", "")
-        if not clean:
+        if len(clean) < 9:
             return None
-        vendor = self._lookup_mac_lookup(mac, clean)
-        if vendor:
+        oui = clean[:6]
+        hit, vendor = self.cache.get(oui)
+        if hit and vendor is SUBDIVIDED:
+            # OUI repartido en bloques MA-M/MA-S: la entrada va por 36 bits
+            hit, vendor = self.cache.get(clean[:9])
+        if hit:
             return vendor
-        if len(clean) >= 9:
-            vendor = self._map9.get(clean[:9])
-            if vendor:
-                return vendor
-        return self._map6.get(clean[:6])
+        if not self._ensure_loaded():
+            # mientras se cargan las tablas no se cachea nada
+            return None
+        # la tabla IEEE da el prefijo más largo (MA-S/MA-M); mac_vendor_lookup solo
+        # conoce MA-L, así que únicamente cubre los huecos de la tabla
+        vendor, whole_oui = self._table.lookup_span(clean)
+        vendor = vendor or self._lookup_mac_lookup(mac, clean)
+        if whole_oui:
+            self.cache.put(oui, vendor)
+        else:
+            self.cache.put(oui, SUBDIVIDED)
+            self.cache.put(clean[:9], vendor)
+        return vendor
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
 
 
 VENDOR_LOOKUP = VendorLookup()
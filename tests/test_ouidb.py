@@ -0,0 +1,79 @@
+from raspsentinel.ouidb import OuiDatabase, RangeTable, compile_db, flatten, iter_registry
+
+
+def _span(prefix):
+    shift = 36 - 4 * len(prefix)
+    start = int(prefix, 16) << shift
+    return start, start + (1 << shift) - 1
+
+
+def _entry(prefix, vendor):
+    return _span(prefix) + (vendor,)
+
+
+def _vendor(ranges, clean):
+    return RangeTable(ranges).lookup(clean)
+
+
+def test_flatten_longest_prefix_wins():
+    ranges = flatten([_entry("001122", "Big"), _entry("0011223", "Medium"), _entry("001122345", "Small")])
+
+    assert _vendor(ranges, "001122000000") == "Big"
+    assert _vendor(ranges, "001122300000") == "Medium"
+    assert _vendor(ranges, "001122345678") == "Small"
+    assert _vendor(ranges, "001122346000") == "Medium"
+    assert _vendor(ranges, "001122400000") == "Big"
+
+
+def test_flatten_last_duplicate_wins():
+    ranges = flatten([_entry("001122", "Old"), _entry("001122", "New")])
+
+    assert _vendor(ranges, "001122ABCDEF") == "New"
+
+
+def test_flatten_gaps_have_no_vendor():
+    ranges = flatten([_entry("001122", "A"), _entry("001124", "B")])
+
+    assert _vendor(ranges, "001121FFFFFF") is None
+    assert _vendor(ranges, "001123000000") is None
+    assert _vendor(ranges, "001125000000") is None
+    assert _vendor(ranges, "001124000000") == "B"
+
+
+def test_flatten_merges_adjacent_same_vendor():
+    assert len(flatten([_entry("001122", "A"), _entry("001123", "A")])) == 3
+
+
+def test_lookup_span_reports_subdivided_oui():
+    table = RangeTable(flatten([_entry("001122", "Big"), _entry("0011223", "Medium"), _entry("AABBCC", "Solo")]))
+
+    assert table.lookup_span("AABBCC123456") == ("Solo", True)
+    assert table.lookup_span("001122000000") == ("Big", False)
+    assert table.lookup_span("001122300000") == ("Medium", False)
+    assert table.lookup_span("0011") == (None, False)
+
+
+def test_compiled_table_matches_range_table(tmp_path):
+    registry = tmp_path / "ieee-oui.txt"
+    registry.write_text("001122\tBig\n0011223\tMedium\n001122345\tSmall\nAABBCC\tSolo\n", encoding="utf-8")
+    output = tmp_path / "vendors.bin"
+
+    assert compile_db([str(registry)], str(output)) == 4
+    table = RangeTable(flatten(iter_registry(str(registry))))
+    db = OuiDatabase(str(output))
+    try:
+        for clean in ("001122000000", "001122312345", "001122345000", "AABBCC000001", "FFFFFF000000"):
+            assert db.lookup_span(clean) == table.lookup_span(clean)
+    finally:
+        db.close()
+
+
+def test_iter_registry_ieee_ranges(tmp_path):
+    registry = tmp_path / "oui36.txt"
+    registry.write_text(
+        "70-B3-D5   (hex)\t\tAcme\n"
+        "123000-123FFF     (base 16)\t\tAcme\n",
+        encoding="utf-8",
+    )
+
+    assert list(iter_registry(str(registry))) == [_entry("70B3D5123", "Acme")]
@@ -0,0 +1,84 @@
+import json
+import os
+
+from raspsentinel.store import Store
+
+
+def _lines(path):
+    with open(path, "rb") as f:
+        return f.read().splitlines(keepends=True)
+
+
+def test_changes_go_to_journal_and_replay(tmp_path):
+    store = Store(str(tmp_path), journal=True)
+    store.upsert_many([{"mac": "aa:bb:cc:00:00:01", "ip": "10.0.0.2", "vendor": "Acme"}])
+    store.set_name("AA:BB:CC:00:00:01", "tele")
+    store.close()
+
+    assert len(_lines(store.journal_path)) == 2
+    with open(store.path, encoding="utf-8") as f:
+        assert json.load(f)["devices"] == {}
+
+    dev = Store(str(tmp_path), journal=True).get_device("AA:BB:CC:00:00:01")
+    assert dev["name"] == "tele"
+    assert dev["ip"] == "10.0.0.2"
+
+
+def test_delete_is_replayed(tmp_path):
+    store = Store(str(tmp_path), journal=True)
+    store.upsert_many([{"mac": "AA:BB:CC:00:00:01", "ip": "10.0.0.2", "vendor": None}])
+    store.delete_devices(["AA:BB:CC:00:00:01"])
+    store.close()
+
+    assert Store(str(tmp_path), journal=True).get_device("AA:BB:CC:00:00:01") is None
+
+
+def test_torn_tail_is_discarded(tmp_path):
+    store = Store(str(tmp_path), journal=True)
+    store.upsert_many([{"mac": "AA:BB:CC:00:00:01", "ip": "10.0.0.2", "vendor": None}])
+    store.close()
+    good = os.path.getsize(store.journal_path)
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"m":"AA:BB:CC:00:00:02","d":{"ip":')
+
+    reopened = Store(str(tmp_path), journal=True)
+    assert reopened.get_device("AA:BB:CC:00:00:01")["ip"] == "10.0.0.2"
+    assert reopened.get_device("AA:BB:CC:00:00:02") is None
+
+    # la siguiente escritura recorta el registro roto antes de añadir el suyo
+    reopened.set_name("AA:BB:CC:00:00:01", "tele")
+    lines = _lines(store.journal_path)
+    assert sum(len(line) for line in lines[:-1]) == good
+    assert Store(str(tmp_path), journal=True).get_device("AA:BB:CC:00:00:01")["name"] == "tele"
+
+
+def test_write_behind_load_repairs_torn_tail(tmp_path):
+    store = Store(str(tmp_path), journal=True)
+    store.upsert_many([{"mac": "AA:BB:CC:00:00:01", "ip": "10.0.0.2", "vendor": None}])
+    store.close()
+    good = os.path.getsize(store.journal_path)
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"m":"AA:BB:CC:00:00:02"')
+
+    Store(str(tmp_path), journal=True, write_behind=True, flush_interval=3600).close()
+    assert os.path.getsize(store.journal_path) == good
+
+
+def test_compaction_empties_journal(tmp_path):
+    store = Store(str(tmp_path), journal=True, journal_max_bytes=1)
+    store.upsert_many([{"mac": "AA:BB:CC:00:00:01", "ip": "10.0.0.2", "vendor": None}])
+    store.close()
+
+    assert os.path.getsize(store.journal_path) == 0
+    with open(store.path, encoding="utf-8") as f:
+        assert "AA:BB:CC:00:00:01" in json.load(f)["devices"]
+
+
+def test_write_behind_flush_uses_journal(tmp_path):
+    store = Store(str(tmp_path), journal=True, write_behind=True, flush_interval=3600)
+    store.upsert_many([{"mac": "AA:BB:CC:00:00:01", "ip": "10.0.0.2", "vendor": None}])
+    store.flush()
+
+    assert len(_lines(store.journal_path)) == 1
+    store.close()
+    assert Store(str(tmp_path), journal=True).get_device("AA:BB:CC:00:00:01")["ip"] == "10.0.0.2"